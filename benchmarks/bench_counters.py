@@ -0,0 +1,119 @@
+"""
+Compare ways of counting cars in CarPark, with 1 to 16 threads handling
+sensor messages at once. Each thread calls on_car_entry() and on_car_exit()
+in turn, with the network stubbed out, so the car park publishes (and reads
+the total) on every event as it does in service.
+
+- locked: CarPark as it is, with the count changed under a single lock.
+- sharded: entries counted on a lock-free ShardedCounter and exits under a
+  lock, as exits must check there is a car to leave.
+
+    python benchmarks/bench_counters.py [events per thread]
+"""
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+SMARTPARK_DIR = Path(__file__).resolve().parent.parent / 'smartpark'
+CONFIG_FILE = SMARTPARK_DIR.parent / 'config' / 'tiny_carpark.toml'
+sys.path.insert(0, str(SMARTPARK_DIR))
+
+import mqtt_device
+from counters import ShardedCounter
+from simple_mqtt_carpark import CarPark
+
+THREAD_COUNTS = [1, 2, 4, 8, 16]
+
+
+class StubClient:
+    """Stands in for the paho client, discarding everything published."""
+    def __init__(self):
+        self.on_connect = None
+        self.on_message = None
+
+    def connect(self, host, port=None, keepalive=60):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        pass
+
+
+class ShardedCarPark(CarPark):
+    """CarPark counting entries on a ShardedCounter, for comparison."""
+    def __init__(self, config_file: str, test_mode: bool = False):
+        # set up before CarPark publishes its first update
+        self._entries = ShardedCounter()
+        self._exits = 0
+        self._exit_lock = threading.Lock()
+        super().__init__(config_file, test_mode)
+
+    @property
+    def total_cars(self):
+        return self._cars + self._entries.value - self._exits
+
+    def on_car_entry(self):
+        self._entries.add()
+        self._publish_event()
+
+    def on_car_exit(self):
+        with self._exit_lock:
+            if self.total_cars > 0:
+                self._exits += 1
+        self._publish_event()
+
+
+def run(carpark_class, threads: int, events: int) -> float:
+    """
+    Deliver car events to a car park from several threads at once.
+
+    :param carpark_class: CarPark or ShardedCarPark
+    :param threads: integer, number of threads to run
+    :param events: integer, number of events delivered by each thread
+    :returns: float, events per second across all threads
+    """
+    carpark = carpark_class(str(CONFIG_FILE), test_mode=True)
+    initial_cars = carpark.total_cars
+    start_together = threading.Barrier(threads + 1)
+
+    def deliver():
+        start_together.wait()
+        for _ in range(events // 2):
+            carpark.on_car_entry()
+            carpark.on_car_exit()
+
+    workers = [threading.Thread(target=deliver) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_together.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    if carpark.total_cars != initial_cars:
+        raise AssertionError(f'{carpark_class.__name__} miscounted cars')
+    return threads * (events // 2) * 2 / elapsed
+
+
+def main(events: int):
+    # CarPark prints every update, which would swamp the results
+    with open(os.devnull, 'w') as devnull, \
+            mock.patch.object(mqtt_device.MqttDevice, '_create_paho_client',
+                              side_effect=StubClient):
+        print('Car events per second across all threads')
+        print(f"{'threads':>8}{'locked':>12}{'sharded':>12}")
+        for threads in THREAD_COUNTS:
+            with mock.patch('sys.stdout', devnull):
+                results = [run(carpark_class, threads, events)
+                           for carpark_class in (CarPark, ShardedCarPark)]
+            print(f'{threads:>8}{results[0]:>12.0f}{results[1]:>12.0f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40_000)
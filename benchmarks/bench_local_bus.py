@@ -0,0 +1,128 @@
+"""
+Compare round-trip latency and one-way throughput of the local bus against an
+MQTT broker on localhost. The MQTT half is skipped if no broker is running.
+
+    python benchmarks/bench_local_bus.py [messages]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'smartpark'))
+
+import paho.mqtt.client as paho
+
+import local_bus
+
+PAYLOAD = 'TIME: 10:00, SPACES: 150, TEMPC: 22'
+
+
+def run_round_trips(make_client, messages: int) -> float:
+    """
+    Bounce messages between two clients, one at a time.
+
+    :param make_client: function returning a new connected client
+    :param messages: integer, number of round trips to make
+    :returns: float, mean round trip time in microseconds
+    """
+    echo = make_client()
+    echo.on_message = lambda client, userdata, msg: client.publish(
+        'bench/pong', msg.payload)
+    echo.subscribe('bench/ping')
+    echo.loop_start()
+
+    pong = threading.Event()
+    sender = make_client()
+    sender.on_message = lambda client, userdata, msg: pong.set()
+    sender.subscribe('bench/pong')
+    sender.loop_start()
+    time.sleep(0.5)  # let the subscriptions reach the broker
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        pong.clear()
+        sender.publish('bench/ping', PAYLOAD)
+        if not pong.wait(timeout=5):
+            raise TimeoutError('Round trip timed out')
+    elapsed = time.perf_counter() - start
+
+    sender.loop_stop()
+    echo.loop_stop()
+    return elapsed / messages * 1_000_000
+
+
+def run_throughput(make_client, messages: int) -> float:
+    """
+    Publish messages as fast as possible and time until all are received.
+
+    :param make_client: function returning a new connected client
+    :param messages: integer, number of messages to send
+    :returns: float, messages received per second
+    """
+    received = 0
+    done = threading.Event()
+
+    def on_message(client, userdata, msg):
+        nonlocal received
+        received += 1
+        if received == messages:
+            done.set()
+
+    receiver = make_client()
+    receiver.on_message = on_message
+    receiver.subscribe('bench/throughput')
+    receiver.loop_start()
+    sender = make_client()
+    sender.loop_start()
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        sender.publish('bench/throughput', PAYLOAD)
+    if not done.wait(timeout=60):
+        raise TimeoutError(f'Only {received} of {messages} messages arrived')
+    elapsed = time.perf_counter() - start
+
+    sender.loop_stop()
+    receiver.loop_stop()
+    return messages / elapsed
+
+
+def main(messages: int):
+    directory = tempfile.TemporaryDirectory()
+    hub = local_bus.LocalBusHub(os.path.join(directory.name, 'bench.sock'))
+    hub.start()
+
+    def make_local_client():
+        client = local_bus.LocalBusClient()
+        client.connect(hub.path)
+        return client
+
+    def make_mqtt_client():
+        client = paho.Client()
+        client.max_queued_messages_set(0)
+        client.connect('localhost', 1883)
+        return client
+
+    results = {'local bus': make_local_client}
+    try:
+        make_mqtt_client().disconnect()
+        results['localhost MQTT'] = make_mqtt_client
+    except OSError as os_error:
+        print(f"Skipping localhost MQTT: {os_error}")
+
+    print(f"{'transport':<16}{'round trip (us)':>18}{'msgs/sec':>12}")
+    for name, make_client in results.items():
+        latency = run_round_trips(make_client, min(messages, 2000))
+        throughput = run_throughput(make_client, messages)
+        print(f"{name:<16}{latency:>18.1f}{throughput:>12.0f}")
+
+    hub.close()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
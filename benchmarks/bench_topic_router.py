@@ -0,0 +1,110 @@
+"""
+Measure how the cost of dispatching a message changes as the number of
+subscriptions grows, for the trie-based TopicRouter and for checking every
+subscription in turn.
+
+    python benchmarks/bench_topic_router.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'smartpark'))
+
+from local_bus import LocalMessage
+from topic_router import TopicRouter, topic_matches
+
+SIZES = [100, 1000, 10_000, 100_000]
+LINEAR_LIMIT = 10_000  # checking every subscription gets too slow beyond this
+LOCATIONS = 50
+MESSAGES = 20_000
+
+
+def make_subscriptions(count: int) -> list:
+    """
+    Create subscriptions like those of a large deployment: mostly exact
+    per-lot topics, with some per-lot and per-location wildcards.
+
+    :param count: integer, number of subscriptions to create
+    :returns: list of subscription strings
+    """
+    subscriptions = []
+    for i in range(count):
+        location = f'location-{i % LOCATIONS}'
+        kind = i % 10
+        if kind == 0:
+            subscriptions.append(f'smartpark/+/lot-{i}/carpark')
+        elif kind == 1:
+            subscriptions.append(f'smartpark/{location}/lot-{i}/#')
+        else:
+            message_type = ('sensor', 'temperature', 'carpark')[kind % 3]
+            subscriptions.append(
+                f'smartpark/{location}/lot-{i}/{message_type}')
+    return subscriptions
+
+
+def make_messages(count: int, lots: int) -> list:
+    """
+    Create messages published by randomly chosen lots.
+
+    :param count: integer, number of messages to create
+    :param lots: integer, number of lots to choose from
+    :returns: list of LocalMessage
+    """
+    messages = []
+    for _ in range(count):
+        i = random.randrange(lots)
+        message_type = random.choice(['sensor', 'temperature', 'carpark'])
+        messages.append(LocalMessage(
+            f'smartpark/location-{i % LOCATIONS}/lot-{i}/{message_type}',
+            b''))
+    return messages
+
+
+def time_router(subscriptions: list, messages: list) -> float:
+    """
+    :returns: float, mean dispatch time in microseconds using the trie
+    """
+    def handler(client, userdata, msg):
+        pass
+
+    router = TopicRouter()
+    for subscription in subscriptions:
+        router.add(subscription, handler)
+
+    start = time.perf_counter()
+    for msg in messages:
+        router.dispatch(None, None, msg)
+    return (time.perf_counter() - start) / len(messages) * 1_000_000
+
+
+def time_linear(subscriptions: list, messages: list) -> float:
+    """
+    :returns: float, mean dispatch time in microseconds checking every
+        subscription in turn
+    """
+    start = time.perf_counter()
+    for msg in messages:
+        for subscription in subscriptions:
+            topic_matches(subscription, msg.topic)
+    return (time.perf_counter() - start) / len(messages) * 1_000_000
+
+
+def main():
+    random.seed(1)
+    print(f"{'subscriptions':>14}{'trie (us)':>12}{'linear (us)':>14}")
+    for size in SIZES:
+        subscriptions = make_subscriptions(size)
+        messages = make_messages(MESSAGES, size)
+        trie = time_router(subscriptions, messages)
+        if size <= LINEAR_LIMIT:
+            linear = time_linear(subscriptions, messages[:max(MESSAGES // size, 20)])
+            linear = f'{linear:>14.1f}'
+        else:
+            linear = f"{'-':>14}"
+        print(f'{size:>14}{trie:>12.2f}{linear}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Profile how quickly the car park starts up. Reports the import time of each
+module (and whether it pulls in paho or tkinter), then starts CarPark in a
+fresh process and measures the time until its first status update arrives,
+with and without lazy-connect.
+
+By default a local bus hub is started so no MQTT broker is needed. Pass a
+broker setting to measure against a real broker instead ('-' for the local
+bus):
+
+    python benchmarks/startup_profile.py [broker] [runs]
+    python benchmarks/startup_profile.py localhost 5
+"""
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+
+SMARTPARK_DIR = Path(__file__).resolve().parent.parent / 'smartpark'
+CONFIG_FILE = SMARTPARK_DIR.parent / 'config' / 'tiny_carpark.toml'
+sys.path.insert(0, str(SMARTPARK_DIR))
+
+import local_bus
+import mqtt_device
+
+MODULES = ['config_parser', 'mqtt_device', 'simple_mqtt_carpark',
+           'car_detector', 'carpark_display']
+HEAVY_MODULES = ['paho.mqtt.client', 'tkinter']
+
+START_CARPARK = ("import simple_mqtt_carpark; "
+                 "simple_mqtt_carpark.CarPark({config!r})")
+
+
+def profile_import(module: str) -> tuple:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    :param module: string containing the name of the module to import
+    :returns: tuple of (cumulative import time in milliseconds, list of the
+        heavy modules that were imported along with it)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SMARTPARK_DIR, capture_output=True, text=True, check=True)
+    cumulative_us = 0
+    heavy = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if name == module:
+            cumulative_us = int(cumulative)
+        if name in HEAVY_MODULES:
+            heavy.append(name)
+    return cumulative_us / 1000, heavy
+
+
+def write_config(config: dict, config_file: str):
+    """
+    Write car park configuration to a TOML file.
+
+    :param config: dictionary of car park configuration
+    :param config_file: string containing the path of the file to write
+    """
+    lines = ['[config]']
+    for key, value in config.items():
+        if isinstance(value, bool):
+            value = str(value).lower()
+        elif isinstance(value, str):
+            value = f'"{value}"'
+        lines.append(f'{key} = {value}')
+    with open(config_file, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def time_to_first_publish(config: dict, directory: str) -> float:
+    """
+    Start a CarPark in a fresh process and time how long it takes for its
+    first status update to arrive.
+
+    :param config: dictionary of car park configuration to start with
+    :param directory: string containing a scratch directory for the config
+        file and the car park's log files
+    :returns: float, time to first publish in milliseconds
+    """
+    config_file = os.path.join(directory, 'carpark.toml')
+    write_config(config, config_file)
+
+    # listen for the status update with eager settings, so the listener is
+    # ready before the car park starts
+    received = queue.Queue()
+    listener = mqtt_device.MqttDevice({**config, 'lazy-connect': False})
+    listener.subscribe(
+        listener.topic,
+        lambda client, userdata, msg: received.put(time.perf_counter()))
+    listener.client.loop_start()
+    time.sleep(0.5)  # let the subscription reach the broker
+
+    # the car park writes its logs to ../logs, so run it from a subdirectory
+    working_directory = os.path.join(directory, 'run')
+    os.makedirs(working_directory, exist_ok=True)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', START_CARPARK.format(config=config_file)],
+        cwd=working_directory, stdout=subprocess.DEVNULL,
+        env={**os.environ, 'PYTHONPATH': str(SMARTPARK_DIR)})
+    try:
+        first_publish = received.get(timeout=30)
+    finally:
+        process.kill()
+        process.wait()
+        listener.client.loop_stop()
+        listener.client.disconnect()
+    return (first_publish - start) * 1000
+
+
+def main(broker: str, runs: int):
+    print(f"{'module':<22}{'import (ms)':>12}  heavy imports")
+    for module in MODULES:
+        import_ms, heavy = profile_import(module)
+        print(f"{module:<22}{import_ms:>12.1f}  {', '.join(heavy) or '-'}")
+    print()
+
+    with open(CONFIG_FILE, 'rb') as file:
+        config = tomllib.load(file)['config']
+
+    with tempfile.TemporaryDirectory() as directory:
+        hub = None
+        if broker is None:
+            hub = local_bus.LocalBusHub(os.path.join(directory, 'bus.sock'))
+            hub.start()
+            broker = local_bus.SCHEME + hub.path
+        config['broker'] = broker
+
+        print(f"Time to first publish via {broker}, best of {runs}:")
+        for lazy in (False, True):
+            timings = [
+                time_to_first_publish({**config, 'lazy-connect': lazy},
+                                      directory)
+                for _ in range(runs)
+            ]
+            mode = 'lazy-connect' if lazy else 'eager connect'
+            print(f"  {mode:<20}{min(timings):>8.1f} ms")
+
+        if hub is not None:
+            hub.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] != '-' else None,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 3)
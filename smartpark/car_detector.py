@@ -1,9 +1,10 @@
 """
 Provides a simple window with buttons to simulate sensor data from the car
 park. Simulates cars entering and exiting the car park and the local
-temperature being monitored, and publishes this data to MQTT.
+temperature being monitored, and publishes this data to MQTT. Car events are
+published as they happen; temperature readings are published separately at a
+regular interval.
 """
-import tkinter as tk
 from datetime import datetime
 import random
 
@@ -17,6 +18,7 @@ class CarDetector:
     """
     MIN_TEMPERATURE = 10
     MAX_TEMPERATURE = 35
+    TEMPERATURE_INTERVAL_MS = 5000  # how often to publish the temperature
 
     def __init__(self, config_file: str, test_mode: bool=False):
         """
@@ -28,6 +30,10 @@ class CarDetector:
         :param test_mode: bool representing whether the class is running in
             unit test mode (in which case we avoid running any blocking loops)
         """
+        # tkinter is imported here so the module can be imported quickly
+        # without it, e.g. by tests and the startup profiler
+        import tkinter as tk
+
         config = parse_config(config_file)
         self.mqtt_device = mqtt_device.MqttDevice(config)
 
@@ -49,6 +55,8 @@ class CarDetector:
         self.btn_outgoing_car.pack(padx=10, pady=5)
 
         if not test_mode:
+            self.root.after(self.TEMPERATURE_INTERVAL_MS,
+                            self._publish_temperature)
             self.root.mainloop()
 
     def _publish_event(self, action: str):
@@ -59,20 +67,27 @@ class CarDetector:
             'entry' or 'exit'
         """
         readable_time = datetime.now().strftime('%H:%M')
-        self.update_temperature()
-        print(
-            (
+        message = (
                 f"ACTION: {action}, "
-                f"TIME: {readable_time}, "
-                + f"TEMPC: {self.temperature}"
-            )
+                + f"TIME: {readable_time}"
         )
+        print(message)
+        self.mqtt_device.publish(self.mqtt_device.sensor_topic, message)
+
+    def _publish_temperature(self):
+        """
+        Publish a temperature reading via MQTT, then schedule the next one.
+        """
+        readable_time = datetime.now().strftime('%H:%M')
+        self.update_temperature()
         message = (
-                f"ACTION: {action}, "
                 f"TIME: {readable_time}, "
                 + f"TEMPC: {self.temperature}"
         )
-        self.mqtt_device.client.publish('sensor', message)
+        self.mqtt_device.publish(self.mqtt_device.temperature_topic,
+                                 message)
+        self.root.after(self.TEMPERATURE_INTERVAL_MS,
+                        self._publish_temperature)
 
     @property
     def temperature(self):
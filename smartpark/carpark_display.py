@@ -2,15 +2,17 @@
 Display car park availability and temperature data for use of drivers in
 Moondalup.
 """
+import sys
 import threading
-import tkinter as tk
-from typing import Iterable
-
-from paho.mqtt.client import MQTTMessage
+from typing import Iterable, TYPE_CHECKING
 
+from carpark_table import CarParkTableModel, parse_payload
 from config_parser import parse_config
 import mqtt_device
 
+if TYPE_CHECKING:
+    from paho.mqtt.client import MQTTMessage
+
 
 class WindowedDisplay:
     """
@@ -33,6 +35,8 @@ class WindowedDisplay:
             the UI. Updates to values must be presented in a dictionary with
             these values as keys.
         """
+        import tkinter as tk
+
         self.window = tk.Tk()
         self.window.title(f'{title}: Parking')
         self.window.geometry('800x400')
@@ -99,8 +103,7 @@ class CarParkDisplay:
         config = parse_config(config_file)
         self.carpark_name = config['name']
         self.mqtt_device = mqtt_device.MqttDevice(config)
-        self.mqtt_device.client.subscribe('carpark')
-        self.mqtt_device.client.on_message = self.on_message
+        self.mqtt_device.subscribe(self.mqtt_device.topic, self.on_message)
 
         self.window = WindowedDisplay(
             self.carpark_name, CarParkDisplay.fields)
@@ -111,9 +114,9 @@ class CarParkDisplay:
 
     def check_updates(self):
         """Check for updates from the MQTT subscription."""
-        self.mqtt_device.client.loop_forever()
+        self.mqtt_device.loop_forever()
 
-    def on_message(self, client, userdata, msg: MQTTMessage):
+    def on_message(self, client, userdata, msg: 'MQTTMessage'):
         """
         On receiving a car park update through MQTT, display the new
         information in the window.
@@ -127,11 +130,7 @@ class CarParkDisplay:
         # Rather than assume the data will always be received ordered the same
         # way, we save the keys with the data so we can access exactly the
         # information we want.
-        fields = payload.split(',')
-        received = dict()
-        for field in fields:
-            label, data = field.split(':', 1)
-            received[label.strip()] = data.strip()
+        received = parse_payload(payload)
 
         # NOTE: Dictionary keys *must* be the same as the class fields
         field_values = dict()
@@ -143,5 +142,261 @@ class CarParkDisplay:
         self.window.update(field_values)
 
 
+class VirtualGridDisplay:
+    """
+    Displays a CarParkTableModel as a scrollable grid in a GUI window. Only
+    enough rows to fill the window are created; scrolling changes which table
+    rows they show. Use .show() to display the window.
+
+    The window polls the model for changes a few times a second rather than
+    redrawing on every update, so bursts of updates are drawn together and
+    only rows that are on screen and have changed are touched.
+
+    Temperatures far out of line with the other car parks are highlighted.
+    """
+
+    DISPLAY_FULL = 'FULL'
+    ANOMALY_COLOUR = 'red'
+    REFRESH_MS = 250  # how often to check the model for changes
+
+    def __init__(self, title: str, model: CarParkTableModel,
+                 visible_rows: int = 20):
+        """
+        Creates a window showing the rows of the model.
+
+        :param title: String containing the title of the window
+        :param model: the CarParkTableModel to display
+        :param visible_rows: integer, number of rows to show at once
+        """
+        import tkinter as tk
+
+        self.model = model
+        self.visible_rows = visible_rows
+        self._offset = 0
+        self._sort_column = model.columns[0]
+        self._sort_reverse = False
+        self._anomalies = set()
+
+        self.window = tk.Tk()
+        self.window.title(f'{title}: Parking')
+
+        # filter box
+        self._filter_text = tk.StringVar()
+        self._filter_text.trace_add('write', self._on_filter_changed)
+        tk.Label(self.window, text='Search:', font=('Arial', 14)).grid(
+            row=0, column=0, sticky=tk.E, padx=5, pady=5)
+        tk.Entry(self.window, textvariable=self._filter_text,
+                 font=('Arial', 14)).grid(
+            row=0, column=1, columnspan=len(model.columns) - 1,
+            sticky=tk.W + tk.E, padx=5, pady=5)
+
+        # column headers; click a header to sort by that column
+        for column_index, column in enumerate(model.columns):
+            tk.Button(
+                self.window, text=column, font=('Arial', 14, 'bold'),
+                relief=tk.FLAT,
+                command=lambda name=column: self._on_header_clicked(name)
+            ).grid(row=1, column=column_index, sticky=tk.W + tk.E)
+
+        # a fixed pool of cells, reused as the grid scrolls; the (location,
+        # name) key of the car park shown in each row
+        self._row_keys = [None] * visible_rows
+        self.cells = []
+        for row_index in range(visible_rows):
+            row_cells = []
+            for column_index in range(len(model.columns)):
+                cell = tk.Label(self.window, text='', font=('Arial', 14),
+                                anchor=tk.W)
+                cell.grid(row=row_index + 2, column=column_index,
+                          sticky=tk.W + tk.E, padx=5)
+                row_cells.append(cell)
+            self.cells.append(row_cells)
+        self._default_colour = self.cells[0][0].cget('fg')
+
+        self.scrollbar = tk.Scrollbar(self.window, command=self._on_scroll)
+        self.scrollbar.grid(row=2, column=len(model.columns),
+                            rowspan=visible_rows, sticky=tk.N + tk.S)
+        self.window.bind('<MouseWheel>', self._on_mouse_wheel)
+        self.window.bind('<Button-4>', lambda event: self._scroll_to(
+            self._offset - 1))
+        self.window.bind('<Button-5>', lambda event: self._scroll_to(
+            self._offset + 1))
+
+    def show(self):
+        """Display the GUI. Blocking call."""
+        self.window.after(self.REFRESH_MS, self._refresh)
+        self.window.mainloop()
+
+    def _refresh(self):
+        """Redraw any rows that have changed, then check again shortly."""
+        changed, layout_changed = self.model.take_changes()
+        if changed or layout_changed:
+            anomalies = self.model.anomalous_rows()
+            if anomalies != self._anomalies:
+                self._anomalies = anomalies
+                layout_changed = True
+        if layout_changed:
+            self._redraw_all()
+        elif changed:
+            for row_index, key in enumerate(self._row_keys):
+                if key in changed:
+                    self._draw_row(row_index, key, self.model.row(key))
+        self.window.after(self.REFRESH_MS, self._refresh)
+
+    def _redraw_all(self):
+        """Redraw every row on screen, e.g. after sorting or scrolling."""
+        row_count = self.model.row_count
+        self._offset = max(0, min(self._offset,
+                                  row_count - self.visible_rows))
+        rows = self.model.visible_rows(self._offset, self.visible_rows)
+        for row_index in range(self.visible_rows):
+            if row_index < len(rows):
+                key, row = rows[row_index]
+                self._draw_row(row_index, key, row)
+            elif self._row_keys[row_index] is not None:
+                self._draw_row(row_index, None, ('',) * len(self.model.columns))
+
+        if row_count > self.visible_rows:
+            self.scrollbar.set(self._offset / row_count,
+                               (self._offset + self.visible_rows) / row_count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _draw_row(self, row_index: int, key, row: tuple):
+        """
+        Show a table row in one row of cells, only touching cells whose text
+        has changed.
+
+        :param row_index: integer, index of the row of cells on screen
+        :param key: tuple of (location, name) of the car park shown in the
+            row, or None if empty
+        :param row: tuple of cell values from the model
+        """
+        self._row_keys[row_index] = key
+        spaces_column = self.model.columns.index('Available bays')
+        temperature_column = self.model.columns.index('Temperature')
+        for column_index, value in enumerate(row):
+            if column_index == spaces_column and value == '0':
+                value = self.DISPLAY_FULL
+            cell = self.cells[row_index][column_index]
+            if cell.cget('text') != value:
+                cell.configure(text=value)
+
+        colour = (self.ANOMALY_COLOUR if key in self._anomalies
+                  else self._default_colour)
+        cell = self.cells[row_index][temperature_column]
+        if cell.cget('fg') != colour:
+            cell.configure(fg=colour)
+
+    def _scroll_to(self, offset: int):
+        """
+        Show the rows starting at the given offset.
+
+        :param offset: integer, index of the first table row to show
+        """
+        self._offset = offset
+        self._redraw_all()
+
+    def _on_scroll(self, action: str, amount, units=None):
+        """
+        Handle the scrollbar being moved.
+
+        :param action: 'moveto' or 'scroll', as passed by tkinter
+        :param amount: fraction of the table to move to, or number of units to
+            scroll by
+        :param units: 'units' or 'pages' when scrolling
+        """
+        if action == 'moveto':
+            self._scroll_to(int(float(amount) * self.model.row_count))
+        elif units == 'pages':
+            self._scroll_to(self._offset + int(amount) * self.visible_rows)
+        else:
+            self._scroll_to(self._offset + int(amount))
+
+    def _on_mouse_wheel(self, event):
+        """Scroll the grid with the mouse wheel."""
+        self._scroll_to(self._offset - event.delta // 120)
+
+    def _on_header_clicked(self, column: str):
+        """
+        Sort by the column clicked, reversing the order if it was already the
+        sort column.
+
+        :param column: name of the column clicked
+        """
+        if column == self._sort_column:
+            self._sort_reverse = not self._sort_reverse
+        else:
+            self._sort_column = column
+            self._sort_reverse = False
+        self.model.set_sort(self._sort_column, self._sort_reverse)
+        self._redraw_all()
+
+    def _on_filter_changed(self, *args):
+        """Filter the rows shown when the search text changes."""
+        self.model.set_filter(self._filter_text.get())
+        self._scroll_to(0)
+
+
+class MultiCarParkDisplay:
+    """
+    Provides a wall display of the status of every car park publishing under
+    the configured topic root, for use in the control room.
+    """
+
+    def __init__(self, config_file: str, visible_rows: int = 20):
+        """
+        Start an MQTT client subscribed to updates from all car parks, and
+        create a window to display the updates received.
+
+        :param config_file: string containing relative path and filename of
+            a car park configuration to use in setting up the MQTT client
+        :param visible_rows: integer, number of rows to show at once
+        """
+        config = parse_config(config_file)
+        self.model = CarParkTableModel()
+        self.mqtt_device = mqtt_device.MqttDevice(config)
+        self.mqtt_device.subscribe(
+            f"{self.mqtt_device.topic_root}/+/+/"
+            f"{self.mqtt_device.topic_qualifier}", self.on_message)
+
+        self.window = VirtualGridDisplay(
+            self.mqtt_device.location, self.model, visible_rows)
+        updater = threading.Thread(target=self.check_updates)
+        updater.daemon = True
+        updater.start()
+        self.window.show()
+
+    def check_updates(self):
+        """Check for updates from the MQTT subscription."""
+        self.mqtt_device.loop_forever()
+
+    def on_message(self, client, userdata, msg: 'MQTTMessage'):
+        """
+        On receiving a car park update through MQTT, record it in the table.
+        The window picks up the change the next time it refreshes.
+
+        :param client: The MQTT client which received the message.
+        :param userdata: userdata passed with the MQTT message
+        :param msg: the message received, in MQTTMessage format
+        """
+        # Topics are formatted as root/location/name/qualifier
+        levels = msg.topic.split('/')
+        if len(levels) != 4:
+            return
+        location, name = levels[1], levels[2]
+        # One bad message mustn't stop the network loop, or the display would
+        # stop updating for every car park
+        try:
+            values = parse_payload(msg.payload.decode())
+        except (KeyError, ValueError):
+            print(f"Warning: Skipping unreadable message on '{msg.topic}'.")
+            return
+        self.model.update(name, location, values)
+
+
 if __name__ == '__main__':
-    CarParkDisplay('../config/city_square_parking.toml')
\ No newline at end of file
+    if '--all' in sys.argv:
+        MultiCarParkDisplay('../config/city_square_parking.toml')
+    else:
+        CarParkDisplay('../config/city_square_parking.toml')
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+A table of car park statuses for displays that show many car parks at once.
+Keeps the rows sorted and filtered, and remembers which rows have changed so
+a display only needs to redraw those.
+"""
+import threading
+
+from telemetry import find_anomalous_carparks
+
+
+def parse_payload(payload: str) -> dict:
+    """
+    Split a car park MQTT payload into a dictionary of labelled values.
+
+    :param payload: string in the form 'LABEL: value, LABEL: value, ...'
+    :returns: dictionary mapping each label to its value, both stripped of
+        surrounding whitespace
+    """
+    received = dict()
+    for field in payload.split(','):
+        label, data = field.split(':', 1)
+        received[label.strip()] = data.strip()
+    return received
+
+
+def _sort_value(value: str):
+    """
+    Return a key that sorts numbers numerically and ahead of any text, so that
+    'unknown' temperatures and the like sort to the end of the table.
+
+    :param value: string value displayed in a table cell
+    """
+    try:
+        return 0, int(value), ''
+    except ValueError:
+        return 1, 0, value.lower()
+
+
+class CarParkTableModel:
+    """
+    Stores the latest status of each car park, keyed by (location, name), as
+    car parks in different locations may share a name. Rows are presented
+    sorted by any column and filtered by a search string. The model may be
+    updated from the MQTT thread while a GUI thread reads from it.
+    """
+    # determines what columns appear in the table
+    columns = ['Car park', 'Location', 'Available bays', 'Temperature', 'At']
+    # map table columns to MQTT data fields
+    mqtt_data_map = {
+        'Available bays': 'SPACES',
+        'Temperature': 'TEMPC',
+        'At': 'TIME',
+    }
+
+    def __init__(self, sort_column: str = 'Car park', reverse: bool = False):
+        """
+        Create an empty table.
+
+        :param sort_column: name of the column used to order the rows
+        :param reverse: bool representing whether to sort in descending order
+        :raises ValueError: if sort_column is not one of the table columns
+        """
+        self._lock = threading.Lock()
+        self._rows = dict()
+        self._changed = set()
+        self._order = []
+        self._order_changed = True
+        self._layout_changed = True
+        self._filter_text = ''
+        self._sort_index = 0
+        self._reverse = False
+        self.set_sort(sort_column, reverse)
+
+    def __len__(self):
+        """Return the number of car parks known to the table."""
+        return len(self._rows)
+
+    @property
+    def row_count(self):
+        """Return the number of rows that pass the current filter."""
+        with self._lock:
+            return len(self._sorted_keys())
+
+    def set_sort(self, column: str, reverse: bool = False):
+        """
+        Order the rows by the given column.
+
+        :param column: name of the column to sort by
+        :param reverse: bool representing whether to sort in descending order
+        :raises ValueError: if column is not one of the table columns
+        """
+        if column not in self.columns:
+            raise ValueError(f"Unknown column '{column}'")
+        with self._lock:
+            self._sort_index = self.columns.index(column)
+            self._reverse = reverse
+            self._invalidate_order()
+
+    def set_filter(self, text: str):
+        """
+        Only show rows where some cell contains the given text. Matching is
+        case-insensitive; an empty string shows every row.
+
+        :param text: string to search for
+        """
+        with self._lock:
+            self._filter_text = text.strip().lower()
+            self._invalidate_order()
+
+    def update(self, name: str, location: str, values: dict) -> bool:
+        """
+        Record the latest status of a car park.
+
+        :param name: string containing the name of the car park
+        :param location: string containing the location of the car park
+        :param values: dictionary of MQTT data fields, as returned by
+            parse_payload()
+        :returns: boolean representing whether the row changed
+        """
+        row = [name, location]
+        for column in self.columns[2:]:
+            row.append(values.get(self.mqtt_data_map[column], ''))
+        row = tuple(row)
+
+        key = (location, name)
+        with self._lock:
+            old_row = self._rows.get(key)
+            if old_row == row:
+                return False
+            self._rows[key] = row
+            self._changed.add(key)
+            # A new row, or a new value in the sort column, may move the row.
+            # Any new value may also move a row in or out of the filter.
+            if (old_row is None or self._filter_text
+                    or old_row[self._sort_index] != row[self._sort_index]):
+                self._invalidate_order()
+        return True
+
+    def row(self, key: tuple) -> tuple:
+        """
+        Return the cells of a row as a tuple in column order.
+
+        :param key: tuple of (location, name) identifying the car park
+        :raises KeyError: if the car park is not in the table
+        """
+        with self._lock:
+            return self._rows[key]
+
+    def anomalous_rows(self) -> set:
+        """
+        Find the car parks whose temperature is far out of line with the
+        others, which may indicate a faulty sensor or a fire.
+
+        :returns: set of (location, name) keys of car parks with anomalous
+            temperatures
+        """
+        column = self.columns.index('Temperature')
+        temperatures = dict()
+        with self._lock:
+            for key, row in self._rows.items():
+                try:
+                    temperatures[key] = float(row[column])
+                except ValueError:
+                    pass  # temperature unknown
+        return set(find_anomalous_carparks(temperatures))
+
+    def visible_rows(self, start: int, count: int) -> list:
+        """
+        Return a window of the sorted and filtered rows, for displays that
+        only draw the rows currently on screen.
+
+        :param start: index of the first row to return
+        :param count: maximum number of rows to return
+        :returns: list of (key, row) tuples, where key is (location, name)
+        """
+        with self._lock:
+            keys = self._sorted_keys()[start:start + count]
+            return [(key, self._rows[key]) for key in keys]
+
+    def take_changes(self) -> tuple:
+        """
+        Return and clear the record of what changed since the last call.
+
+        :returns: tuple of (set of keys of changed rows, boolean representing
+            whether the order of the rows may have changed)
+        """
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            layout_changed, self._layout_changed = self._layout_changed, False
+            return changed, layout_changed
+
+    def _invalidate_order(self):
+        """
+        Mark the cached row order as out of date. Must be called with the lock
+        held.
+        """
+        self._order_changed = True
+        self._layout_changed = True
+
+    def _sorted_keys(self) -> list:
+        """
+        Return the keys of the rows that pass the filter, in sorted order.
+        The order is cached and only rebuilt when it may have changed. Must be
+        called with the lock held.
+        """
+        if self._order_changed:
+            keys = self._rows
+            if self._filter_text:
+                keys = [key for key, row in self._rows.items()
+                        if any(self._filter_text in cell.lower()
+                               for cell in row)]
+            self._order = sorted(
+                keys, reverse=self._reverse,
+                key=lambda key: (_sort_value(self._rows[key][self._sort_index]),
+                                 key[1].lower(), key[0].lower()))
+            if self._reverse:
+                # put text back after the numbers, keeping each group in
+                # descending order (sort() is stable)
+                self._order.sort(
+                    key=lambda key: _sort_value(
+                        self._rows[key][self._sort_index])[0])
+            self._order_changed = False
+        return self._order
@@ -0,0 +1,66 @@
+"""
+A counter that can be updated from many threads at once without a lock.
+"""
+import threading
+
+
+class ShardedCounter:
+    """
+    Counts events from many threads without them contending for a lock. Each
+    thread adds to its own shard of the counter, which no other thread writes
+    to, and the shards are summed when the value is read.
+
+    When a new thread first updates the counter, the shards of threads that
+    have finished are folded into a single total, so reads only sum the
+    shards of threads still running.
+    """
+    def __init__(self, initial: int = 0):
+        """
+        :param initial: integer, starting value of the counter
+        """
+        self._local = threading.local()
+        # (total of finished threads' shards, tuple of (thread, shard) pairs
+        # for running threads). Replaced rather than modified, so it can be
+        # read without a lock.
+        self._state = (initial, ())
+        self._lock = threading.Lock()  # only used when adding a shard
+
+    @property
+    def value(self) -> int:
+        """Return the total of every update made so far."""
+        total, shards = self._state
+        return total + sum(shard[0] for _, shard in shards)
+
+    def add(self, amount: int = 1):
+        """
+        Add to the counter.
+
+        :param amount: integer, amount to add (may be negative)
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[0] += amount
+
+    def _new_shard(self) -> list:
+        """
+        Create a shard for the calling thread, folding the shards of finished
+        threads into the total. A finished thread can't update its shard
+        again, so its count is final.
+
+        :returns: a one-element list holding the shard's count
+        """
+        shard = [0]
+        with self._lock:
+            total, shards = self._state
+            running = []
+            for thread, old_shard in shards:
+                if thread.is_alive():
+                    running.append((thread, old_shard))
+                else:
+                    total += old_shard[0]
+            running.append((threading.current_thread(), shard))
+            self._state = (total, tuple(running))
+        self._local.shard = shard
+        return shard
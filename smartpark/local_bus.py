@@ -0,0 +1,394 @@
+"""
+A local publish/subscribe bus for when every part of the car park runs on the
+same device. Messages are passed over a Unix domain socket instead of TCP to
+an MQTT broker. The client mimics the parts of the paho MQTT client used by
+the car park, so MqttDevice can hand either one out.
+
+Run this module to start the bus (in place of the MQTT broker):
+
+    python local_bus.py /tmp/smartpark.sock
+"""
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+from topic_router import TopicRouter
+
+SCHEME = 'unix://'
+
+# Each frame is an operation code, topic length and payload length, followed
+# by the topic and payload themselves.
+_HEADER = struct.Struct('!BHI')
+_SUBSCRIBE = 1
+_UNSUBSCRIBE = 2
+_PUBLISH = 3
+
+# Result codes returned by publish() and subscribe(), as in paho
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def socket_path(broker: str) -> str:
+    """
+    Extract the socket path from a broker setting such as
+    'unix:///tmp/smartpark.sock'.
+
+    :param broker: string containing the broker setting from the config file
+    :returns: string containing the path of the Unix domain socket
+    """
+    return broker[len(SCHEME):]
+
+
+def _send_frame(sock: socket.socket, operation: int, topic: str,
+                payload: bytes = b''):
+    """
+    Write one frame to a socket.
+
+    :param sock: the socket to write to
+    :param operation: integer operation code
+    :param topic: string containing the topic or subscription filter
+    :param payload: bytes containing the message payload
+    """
+    encoded_topic = topic.encode()
+    sock.sendall(_HEADER.pack(operation, len(encoded_topic), len(payload))
+                 + encoded_topic + payload)
+
+
+def _read_frame(reader) -> tuple | None:
+    """
+    Read one frame from a buffered socket reader.
+
+    :param reader: file-like object returned by socket.makefile('rb')
+    :returns: tuple of (operation, topic, payload), or None if the other end
+        has closed the connection
+    """
+    header = reader.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    operation, topic_length, payload_length = _HEADER.unpack(header)
+    topic = reader.read(topic_length).decode()
+    payload = reader.read(payload_length)
+    if len(payload) < payload_length:
+        return None
+    return operation, topic, payload
+
+
+class LocalMessage:
+    """
+    A message received from the local bus, with the same topic and payload
+    attributes as a paho MQTTMessage.
+    """
+    def __init__(self, topic: str, payload: bytes):
+        """
+        :param topic: string containing the topic the message was sent to
+        :param payload: bytes containing the message payload
+        """
+        self.topic = topic
+        self.payload = payload
+
+
+class LocalBusHub:
+    """
+    Passes messages between local bus clients, taking the place of the MQTT
+    broker. Each connected client is served by its own thread.
+    """
+    def __init__(self, path: str):
+        """
+        Create a hub listening on the given Unix domain socket. A stale socket
+        file left behind by an earlier hub is removed.
+
+        :param path: string containing the path of the socket to create
+        """
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+
+        self._lock = threading.Lock()
+        # map each client socket to its lock and set of subscriptions
+        self._clients = dict()
+        # map subscriptions to the sockets of the clients subscribed
+        self._router = TopicRouter()
+
+    def start(self):
+        """Serve clients from a background thread. Non-blocking call."""
+        server_thread = threading.Thread(target=self.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def serve_forever(self):
+        """Accept and serve clients until the hub is closed. Blocking call."""
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._clients[client] = (threading.Lock(), set())
+            client_thread = threading.Thread(target=self._serve_client,
+                                             args=(client,))
+            client_thread.daemon = True
+            client_thread.start()
+
+    def close(self):
+        """
+        Stop accepting clients, disconnect those connected and remove the
+        socket file.
+        """
+        self._server.close()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already disconnected
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _serve_client(self, client: socket.socket):
+        """
+        Handle frames sent by one client until it disconnects.
+
+        :param client: the socket connected to the client
+        """
+        subscriptions = self._clients[client][1]
+        reader = client.makefile('rb')
+        try:
+            while (frame := _read_frame(reader)) is not None:
+                operation, topic, payload = frame
+                if operation == _PUBLISH:
+                    self._forward(topic, payload)
+                elif operation == _SUBSCRIBE:
+                    with self._lock:
+                        if topic not in subscriptions:
+                            self._router.add(topic, client)
+                            subscriptions.add(topic)
+                elif operation == _UNSUBSCRIBE:
+                    with self._lock:
+                        if topic in subscriptions:
+                            subscriptions.remove(topic)
+                            self._router.remove(topic, client)
+        except (OSError, ValueError):
+            pass  # disconnected, or sent an invalid subscription filter
+        finally:
+            with self._lock:
+                for topic in subscriptions:
+                    self._router.remove(topic, client)
+                del self._clients[client]
+            client.close()
+
+    def _forward(self, topic: str, payload: bytes):
+        """
+        Send a published message to every client with a matching
+        subscription. Each client receives the message at most once.
+
+        :param topic: string containing the topic the message was sent to
+        :param payload: bytes containing the message payload
+        """
+        with self._lock:
+            receivers = [(client, self._clients[client][0])
+                         for client in self._router.match(topic)]
+        for client, send_lock in receivers:
+            try:
+                with send_lock:
+                    _send_frame(client, _PUBLISH, topic, payload)
+            except OSError:
+                pass  # the client's own thread will clean up after it
+
+
+class LocalBusClient:
+    """
+    Connects to a LocalBusHub. Provides the subset of the paho MQTT client
+    interface used by the car park: connect, subscribe, publish, on_connect,
+    on_message and the loop methods.
+
+    As with paho, the loop reconnects if the hub goes away, calling
+    on_connect again each time, and messages published while disconnected
+    are dropped.
+    """
+    RETRY_SECONDS = 1  # delay between attempts to reach the hub
+
+    def __init__(self, userdata=None):
+        """
+        :param userdata: passed to the on_connect and on_message callbacks
+        """
+        self.on_connect = None
+        self.on_message = None
+        self._userdata = userdata
+        self._path = None
+        self._sock = None
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def connect(self, path: str, port: int = None, keepalive: int = 60):
+        """
+        Connect to the hub. Blocking call.
+
+        :param path: string containing the path of the hub's socket
+        :param port: ignored; accepted for compatibility with paho
+        :param keepalive: ignored; accepted for compatibility with paho
+        :raises OSError: if the hub cannot be reached
+        """
+        self._path = path
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        with self._send_lock:
+            self._sock = sock
+            self._reader = sock.makefile('rb')
+
+    def connect_async(self, path: str, port: int = None,
+                      keepalive: int = 60):
+        """
+        Connect to the hub once the loop is started, retrying until the hub
+        can be reached. Non-blocking call.
+
+        :param path: string containing the path of the hub's socket
+        :param port: ignored; accepted for compatibility with paho
+        :param keepalive: ignored; accepted for compatibility with paho
+        """
+        self._path = path
+
+    def disconnect(self):
+        """Disconnect from the hub, ending any running loop."""
+        self._stopped = True
+        self._close_socket()
+
+    def _close_socket(self):
+        """Close the connection to the hub, if there is one."""
+        with self._send_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already disconnected
+            sock.close()
+
+    def _send(self, operation: int, topic: str, payload: bytes = b'') -> int:
+        """
+        Send a frame to the hub, unless disconnected.
+
+        :param operation: integer operation code
+        :param topic: string containing the topic or subscription filter
+        :param payload: bytes containing the message payload
+        :returns: integer result code, MQTT_ERR_SUCCESS or MQTT_ERR_NO_CONN
+        """
+        with self._send_lock:
+            if self._sock is None:
+                return MQTT_ERR_NO_CONN
+            try:
+                _send_frame(self._sock, operation, topic, payload)
+            except OSError:
+                return MQTT_ERR_NO_CONN  # the loop will reconnect
+        return MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic: str, qos: int = 0):
+        """
+        Subscribe to a topic, which may contain MQTT wildcards.
+
+        :param topic: string containing the subscription filter
+        :param qos: ignored; messages on the local bus are always delivered
+            while the hub is running
+        :returns: tuple of (result code, message id), as from paho; the
+            message id is always None
+        """
+        return self._send(_SUBSCRIBE, topic), None
+
+    def unsubscribe(self, topic: str):
+        """
+        Stop receiving messages for a subscription.
+
+        :param topic: string containing the subscription filter
+        :returns: tuple of (result code, message id), as from paho; the
+            message id is always None
+        """
+        return self._send(_UNSUBSCRIBE, topic), None
+
+    def publish(self, topic: str, payload=None, qos: int = 0,
+                retain: bool = False):
+        """
+        Publish a message to every client subscribed to the topic. While
+        disconnected from the hub the message is dropped.
+
+        :param topic: string containing the topic to publish to
+        :param payload: string or bytes containing the message
+        :param qos: ignored; accepted for compatibility with paho
+        :param retain: ignored; accepted for compatibility with paho
+        :returns: integer result code, MQTT_ERR_SUCCESS or MQTT_ERR_NO_CONN
+        """
+        if payload is None:
+            payload = b''
+        elif isinstance(payload, str):
+            payload = payload.encode()
+        return self._send(_PUBLISH, topic, payload)
+
+    def loop_forever(self):
+        """
+        Deliver received messages to on_message until disconnect() is
+        called, reconnecting whenever the connection to the hub is lost.
+        Blocking call.
+        """
+        while not self._stopped:
+            if self._sock is None:
+                try:
+                    self.connect(self._path)
+                except OSError:
+                    time.sleep(self.RETRY_SECONDS)
+                    continue
+                if self._stopped:  # disconnect() called while connecting
+                    self._close_socket()
+                    return
+            if self.on_connect is not None:
+                self.on_connect(self, self._userdata, {}, 0)
+            self._read_messages()
+            self._close_socket()
+
+    def _read_messages(self):
+        """Deliver received messages to on_message until the hub is lost."""
+        reader = self._reader
+        while True:
+            try:
+                frame = _read_frame(reader)
+            except (OSError, ValueError):
+                return  # socket closed, or a corrupt frame
+            if frame is None:
+                return
+            operation, topic, payload = frame
+            if self.on_message is not None:
+                self.on_message(self, self._userdata,
+                                LocalMessage(topic, payload))
+
+    def loop_start(self):
+        """Run loop_forever() in a background thread. Non-blocking call."""
+        self._thread = threading.Thread(target=self.loop_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def loop_stop(self):
+        """Disconnect and wait for the background thread to finish."""
+        self.disconnect()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == '__main__':
+    hub = LocalBusHub(sys.argv[1] if len(sys.argv) > 1
+                      else '/tmp/smartpark.sock')
+    print(f"Local bus listening on {hub.path}")
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        hub.close()
@@ -0,0 +1,275 @@
+"""
+Replay recorded car park traffic through MQTT, to reproduce incidents or
+capacity-test the car park with real traffic patterns.
+
+Two kinds of recording can be replayed:
+
+- The .log files written by CarPark. Each line records the car park status
+  after an update, so the sensor messages that caused it are worked out from
+  the change in available spaces and temperature.
+- Binary captures of sensor messages, recorded with --record.
+
+Recordings are read lazily, one message at a time, so even very large files
+are replayed in constant memory. Messages can be replayed in real time, N
+times faster, or as fast as possible:
+
+    python log_replay.py ../logs/tiny-backstreet-carpark.log --speed 60
+    python log_replay.py --record capture.bin
+    python log_replay.py capture.bin --speed 0
+"""
+import argparse
+import struct
+import threading
+import time
+from datetime import datetime
+
+import mqtt_device
+from carpark_table import parse_payload
+from config_parser import parse_config
+
+# Each captured message is its timestamp, topic length and payload length,
+# followed by the topic and payload themselves.
+_CAPTURE_HEADER = struct.Struct('!dHI')
+CAPTURE_MAGIC = b'SPCAP1\n'
+
+
+def read_log(log_file: str, sensor_topic: str, temperature_topic: str,
+             startup_spaces: int = None):
+    """
+    Work out the sensor messages behind each line of a CarPark log file.
+
+    A fall in available spaces is replayed as that many cars entering and a
+    rise as cars exiting; a change in temperature is replayed as a reading.
+    Cars entering or exiting while the car park is over-full don't change the
+    available spaces, so they can't be recovered from the log.
+
+    Each time CarPark starts it logs the available spaces from its config,
+    which would otherwise be replayed as a burst of cars entering or exiting.
+    A line is taken to be a restart if it has the startup spaces and either
+    jumps by more than one space, as a single update moves at most one car,
+    or has an unknown temperature after a known one. Replay carries on from
+    that line without sending any car events for it.
+
+    :param log_file: string containing the path of the log file
+    :param sensor_topic: string containing the topic to send car events to
+    :param temperature_topic: string containing the topic to send
+        temperature readings to
+    :param startup_spaces: integer, available spaces the car park logs when
+        it starts, or None if restarts shouldn't be detected
+    :returns: generator of (timestamp, topic, payload) tuples
+    """
+    previous = None
+    with open(log_file, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                status = parse_payload(line)
+                timestamp = datetime.strptime(
+                    f"{status['DATE']} {status['TIME']}", '%Y-%m-%d %H:%M'
+                ).timestamp()
+                spaces = int(status['SPACES'])
+                temperature = status['TEMPC']
+            except (KeyError, ValueError):
+                print(f"Warning: Skipping unreadable log line '{line}'.")
+                continue
+
+            if previous is not None:
+                change = spaces - previous['spaces']
+                restarted = spaces == startup_spaces and (
+                    abs(change) > 1 or (temperature == 'unknown' and
+                                        previous['temperature'] != 'unknown'))
+                if not restarted:
+                    action = 'exit' if change > 0 else 'entry'
+                    for _ in range(abs(change)):
+                        yield (timestamp, sensor_topic,
+                               f"ACTION: {action}, TIME: {status['TIME']}")
+            if (temperature != 'unknown' and
+                    (previous is None or
+                     temperature != previous['temperature'])):
+                yield (timestamp, temperature_topic,
+                       f"TIME: {status['TIME']}, TEMPC: {temperature}")
+            previous = {'spaces': spaces, 'temperature': temperature}
+
+
+def read_capture(capture_file: str):
+    """
+    Read the messages in a binary capture file. If the file ends part way
+    through a message, e.g. because recording was cut short, that message is
+    dropped with a warning rather than replayed incomplete.
+
+    :param capture_file: string containing the path of the capture file
+    :returns: generator of (timestamp, topic, payload) tuples
+    :raises ValueError: if the file is not a capture file
+    """
+    with open(capture_file, 'rb') as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"'{capture_file}' is not a capture file")
+        while True:
+            header = file.read(_CAPTURE_HEADER.size)
+            if not header:
+                return
+            if len(header) == _CAPTURE_HEADER.size:
+                timestamp, topic_length, payload_length = (
+                    _CAPTURE_HEADER.unpack(header))
+                topic = file.read(topic_length)
+                payload = file.read(payload_length)
+                if (len(topic) == topic_length
+                        and len(payload) == payload_length):
+                    yield timestamp, topic.decode(), payload
+                    continue
+            print(f"Warning: '{capture_file}' ends part way through a "
+                  "message, which has been skipped.")
+            return
+
+
+class CaptureWriter:
+    """
+    Records messages to a binary capture file. Can be used directly as an
+    MqttDevice subscription handler. Each message is flushed to the file as
+    it is written, so little is lost if recording is stopped abruptly.
+    """
+    def __init__(self, capture_file: str):
+        """
+        :param capture_file: string containing the path of the file to create
+        """
+        self._file = open(capture_file, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, client, userdata, msg):
+        """
+        Record a received message.
+
+        :param client: The MQTT client which received the message.
+        :param userdata: userdata passed with the MQTT message
+        :param msg: the message received, with topic and payload attributes
+        """
+        self.write(time.time(), msg.topic, msg.payload)
+
+    def write(self, timestamp: float, topic: str, payload: bytes):
+        """
+        Record a message.
+
+        :param timestamp: float, time the message was received, in seconds
+            since the epoch
+        :param topic: string containing the topic of the message
+        :param payload: bytes containing the message payload
+        """
+        encoded_topic = topic.encode()
+        with self._lock:
+            self._file.write(_CAPTURE_HEADER.pack(
+                timestamp, len(encoded_topic), len(payload)))
+            self._file.write(encoded_topic)
+            self._file.write(payload)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        """Finish writing the capture file."""
+        with self._lock:
+            self._file.close()
+
+
+def replay(messages, publish, speed: float = 1.0) -> tuple:
+    """
+    Publish recorded messages, keeping the gaps between them.
+
+    :param messages: iterable of (timestamp, topic, payload) tuples, in
+        time order
+    :param publish: function taking (topic, payload) to publish a message
+    :param speed: float, how many times faster than real time to replay, or
+        0 to replay as fast as possible
+    :returns: tuple of (number of messages published, seconds taken)
+    """
+    count = 0
+    first_timestamp = None
+    start = time.perf_counter()
+    for timestamp, topic, payload in messages:
+        if speed > 0:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (start + (timestamp - first_timestamp) / speed
+                     - time.perf_counter())
+            if delay > 0:
+                time.sleep(delay)
+        publish(topic, payload)
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay recorded car park traffic through MQTT.')
+    parser.add_argument('file', help='CarPark .log file or capture file')
+    parser.add_argument('--config',
+                        default='../config/city_square_parking.toml',
+                        help='configuration file of the car park that wrote '
+                             'the log')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='times faster than real time; 0 for as fast as '
+                             'possible')
+    parser.add_argument('--record', action='store_true',
+                        help='record sensor messages to the file instead, '
+                             'until interrupted')
+    args = parser.parse_args()
+
+    config = parse_config(args.config)
+    device = mqtt_device.MqttDevice(config)
+    sensor_topics = [f"{device.topic_root}/+/+/sensor",
+                     f"{device.topic_root}/+/+/temperature"]
+
+    if args.record:
+        writer = CaptureWriter(args.file)
+        for topic in sensor_topics:
+            device.subscribe(topic, writer)
+        print(f"Recording to '{args.file}'. Press Ctrl+C to stop.")
+        try:
+            device.loop_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
+            print(f"Recorded {writer.count} messages.")
+        return
+
+    # Count the status updates the car parks publish in response, to report
+    # throughput through the whole pipeline rather than just our own sending
+    updates = 0
+    last_update = None
+
+    def on_update(client, userdata, msg):
+        nonlocal updates, last_update
+        updates += 1
+        last_update = time.perf_counter()
+
+    device.subscribe(f"{device.topic_root}/+/+/{device.topic_qualifier}",
+                     on_update)
+    device.loop_start()
+
+    if args.file.endswith('.log'):
+        startup_spaces = max(config['total-spaces'] - config['total-cars'],
+                             0)
+        messages = read_log(args.file, device.sensor_topic,
+                            device.temperature_topic, startup_spaces)
+    else:
+        messages = read_capture(args.file)
+    start = time.perf_counter()
+    count, elapsed = replay(messages, device.publish, args.speed)
+    time.sleep(1)  # let the last updates arrive
+    device.disconnect()
+
+    print(f"Replayed {count} messages in {elapsed:.2f}s "
+          f"({count / max(elapsed, 1e-9):.0f} messages/s).")
+    if updates:
+        end_to_end = last_update - start
+        print(f"Received {updates} car park updates in {end_to_end:.2f}s "
+              f"({updates / max(end_to_end, 1e-9):.0f} updates/s).")
+    else:
+        print("Received no car park updates; is the car park running?")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 """Simplify creation of MQTT clients from configuration file data."""
-import paho.mqtt.client as paho
+import threading
+from collections import deque
+
+import local_bus
+from topic_router import TopicRouter
+
 class MqttDevice:
     """
     Helper class to simplify creation of MQTT clients from configuration file
@@ -8,7 +13,13 @@ class MqttDevice:
     def __init__(self, config):
         """
         Initialise with information from the configuration data provided and
-        create a paho client to use.
+        create a paho client to use. If the broker is given as a Unix socket
+        path (e.g. 'unix:///tmp/smartpark.sock'), connect to a local bus hub
+        instead, for when every component runs on the same device.
+
+        If the config sets 'lazy-connect' to true, the connection is made in
+        the background rather than blocking here. Messages published before
+        the connection is made are queued and sent once it is.
 
         :param config: dictionary of configuration data including paho settings
         """
@@ -19,21 +30,142 @@ class MqttDevice:
         self.topic_root = config['topic-root']
         self.topic_qualifier = config['topic-qualifier']
         self.topic = self._create_topic_string()
+        self.sensor_topic = self._create_topic_string('sensor')
+        self.temperature_topic = self._create_topic_string('temperature')
 
         # Configure broker
         self.broker = config['broker']
         self.port = config['port']
+        self.lazy = config.get('lazy-connect', False)
+
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._pending = deque()
+        self.router = TopicRouter()
 
+        if self.broker.startswith(local_bus.SCHEME):
+            self.client = local_bus.LocalBusClient()
+            host = local_bus.socket_path(self.broker)
+        else:
+            self.client = self._create_paho_client()
+            host = self.broker
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self.router.dispatch
+        if self.lazy:
+            self.client.connect_async(host, self.port)
+            self.client.loop_start()
+        else:
+            self.client.connect(host, self.port)
+            self.connected.set()
+
+    @staticmethod
+    def _create_paho_client():
+        """
+        Create a paho client. The paho library is only imported when it is
+        needed, as it is slow to import on small devices.
+        """
+        import paho.mqtt.client as paho
         # initialise a paho client and bind it to the object (has-a)
-        self.client = paho.Client()
-        self.client.connect(self.broker,
-                            self.port)
+        return paho.Client()
 
-    def _create_topic_string(self):
+    def _create_topic_string(self, qualifier: str = None):
         """
         Generate the MQTT topic string using the saved configuration data.
 
+        :param qualifier: string naming the kind of message sent on the topic,
+            or None to use the topic qualifier from the configuration
         :returns: string formatted as an MQTT topic
         """
+        if qualifier is None:
+            qualifier = self.topic_qualifier
         return (f"{self.topic_root}/{self.location}/" +
-                f"{self.name}/{self.topic_qualifier}")
\ No newline at end of file
+                f"{self.name}/{qualifier}")
+
+    def _on_connect(self, client, userdata, flags, rc):
+        """
+        Once connected, (re)subscribe to every topic requested so far and send
+        any messages queued while waiting for the connection.
+
+        :param client: The MQTT client which connected.
+        :param userdata: userdata passed with the connection
+        :param flags: response flags sent by the broker
+        :param rc: integer connection result; 0 means success
+        """
+        if rc != 0:
+            return
+        with self._lock:
+            for topic in self._subscriptions:
+                self.client.subscribe(topic)
+            while self._pending:
+                self.client.publish(*self._pending.popleft())
+            self.connected.set()
+
+    def wait_for_connection(self, timeout: float = None) -> bool:
+        """
+        Block until the client has connected to the broker.
+
+        :param timeout: float, maximum number of seconds to wait, or None to
+            wait indefinitely
+        :returns: boolean representing whether the client is connected
+        """
+        return self.connected.wait(timeout)
+
+    def subscribe(self, topic: str, handler):
+        """
+        Subscribe to a topic, now if connected or otherwise as soon as the
+        connection is made. Messages received on the topic are passed to the
+        handler.
+
+        :param topic: string containing the MQTT topic to subscribe to, which
+            may contain the wildcards '+' and '#'
+        :param handler: function taking (client, userdata, msg), called for
+            each message received on the topic
+        """
+        self.router.add(topic, handler)
+        with self._lock:
+            if topic in self._subscriptions:
+                return
+            self._subscriptions.append(topic)
+            if self.connected.is_set():
+                self.client.subscribe(topic)
+
+    def publish(self, topic: str, message: str):
+        """
+        Publish a message, now if connected or otherwise as soon as the
+        connection is made.
+
+        :param topic: string containing the MQTT topic to publish to
+        :param message: string or bytes containing the message to publish
+        """
+        with self._lock:
+            if self.connected.is_set():
+                self.client.publish(topic, message)
+            else:
+                self._pending.append((topic, message))
+
+    def loop_start(self):
+        """
+        Process network traffic in a background thread. Non-blocking call.
+        In lazy mode the network loop is already running in the background.
+        """
+        if not self.lazy:
+            self.client.loop_start()
+
+    def loop_forever(self):
+        """
+        Process network traffic until disconnected. Blocking call. In lazy
+        mode the network loop already runs in the background, so this just
+        waits for it.
+        """
+        if self.lazy:
+            self._stopped.wait()
+        else:
+            self.client.loop_forever()
+
+    def disconnect(self):
+        """Disconnect from the broker and stop any background network loop."""
+        self._stopped.set()
+        self.client.disconnect()
+        self.client.loop_stop()
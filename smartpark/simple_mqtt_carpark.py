@@ -2,19 +2,33 @@
 Representation of a car park. Receives sensor data from the car park, saves
 and processes it, and publishes status updates to be displayed.
 """
+import math
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import mqtt_device
 from config_parser import parse_config
-from paho.mqtt.client import MQTTMessage
+from telemetry import Downsampler, TemperatureFilter
+
+if TYPE_CHECKING:
+    from paho.mqtt.client import MQTTMessage
 
 
 class CarPark:
     """
     Creates a car park object to store the state of cars in the lot and
     publish updates to MQTT.
+
+    Sensor messages may be handled from several threads at once, so the
+    number of cars is only changed under a lock. Counting entries on a
+    lock-free ShardedCounter instead was measured to be 10-30% slower at 1 to
+    16 threads (benchmarks/bench_counters.py), as publishing each update
+    costs far more than waiting for the lock.
     """
+    TEMPERATURE_LOG_INTERVAL = 300  # seconds of readings per temperature log
 
     def __init__(self, config_file: str, test_mode: bool=False):
         """
@@ -32,15 +46,32 @@ class CarPark:
         config = parse_config(config_file)
         self.carpark_name = config['name']
         self.total_spaces = config['total-spaces']
-        self.total_cars = config['total-cars']
+        self._cars = config['total-cars']
+        self._cars_lock = threading.Lock()
         self._temperature = None
+        self._temperature_lock = threading.Lock()
+        self.temperature_filter = TemperatureFilter()
+        self.temperature_log = Downsampler(self.TEMPERATURE_LOG_INTERVAL)
 
         self.mqtt_device = mqtt_device.MqttDevice(config)
-        self.mqtt_device.client.on_message = self.on_message
-        self.mqtt_device.client.subscribe('sensor')
+        self.mqtt_device.subscribe(self.mqtt_device.sensor_topic,
+                                   self.on_sensor_message)
+        self.mqtt_device.subscribe(self.mqtt_device.temperature_topic,
+                                   self.on_temperature_message)
         self._publish_event()
         if not test_mode:
-           self.mqtt_device.client.loop_forever()
+            try:
+                self.mqtt_device.loop_forever()
+            finally:
+                self.shutdown()
+
+    @property
+    def total_cars(self):
+        """
+        Return the number of cars in the car park. Never falls below 0, as an
+        exit is only counted if there is a car to leave.
+        """
+        return self._cars
 
     @property
     def available_spaces(self):
@@ -88,15 +119,17 @@ class CarPark:
 
         if not self._test_mode:
             self._log_update(message)
-        self.mqtt_device.client.publish('carpark', message)
+        self.mqtt_device.publish(self.mqtt_device.topic, message)
 
-    def _log_update(self, message: str):
+    def _log_update(self, message: str, log_name: str = ''):
         """
         Log the transmitted message to a text file. It is expected that the
         message as transmitted will already contain the update time. Add the
         date to the message to be logged for clarity.
 
         :param message: A string containing the message published via MQTT.
+        :param log_name: A string added to the log filename, to keep
+            different kinds of log entry in separate files.
         :returns: boolean representing whether log entry was successfully saved
         """
         log_directory = '../logs/'
@@ -108,7 +141,7 @@ class CarPark:
         message = f"DATE: {readable_date}, {message}"
 
         filename = self.carpark_name.replace(' ', '-').lower()
-        filename = log_directory + filename + '.log'
+        filename = log_directory + filename + log_name + '.log'
         try:
             with open(filename, "a") as file:
                 file.write(message + '\n')
@@ -124,23 +157,95 @@ class CarPark:
         total parking spots as it is possible for a car to be driving around
         the car park unable to find a parking spot.
         """
-        self.total_cars += 1
+        with self._cars_lock:
+            self._cars += 1
         self._publish_event()
 
     def on_car_exit(self):
         """
         Handle a car exiting the car park. Total cars should never fall below
-        0.
+        0, so an exit from an empty car park is ignored.
         """
-        if self.total_cars > 0:
-            self.total_cars -= 1
+        # Check and count under the lock, so two threads can't both take the
+        # last car
+        with self._cars_lock:
+            if self.total_cars > 0:
+                self._cars -= 1
         self._publish_event()
 
-    def on_message(self, client, userdata, msg: MQTTMessage):
+    def on_temperature(self, reading: float):
+        """
+        Handle a temperature reading from the sensor. Readings are smoothed
+        and obvious glitches discarded, so the temperature displayed doesn't
+        jump around with sensor noise. An update is only published when the
+        smoothed temperature changes.
+
+        :param reading: float, temperature reading from the sensor
+        """
+        # Readings only arrive every few seconds, so a lock costs little here
+        with self._temperature_lock:
+            if not self.temperature_filter.update(reading):
+                print("Warning: Ignoring outlying temperature reading "
+                      + f"{reading}.")
+                return
+
+            summary = self.temperature_log.add(self.carpark_name, time.time(),
+                                               reading)
+            smoothed = round(self.temperature_filter.value)
+            changed = smoothed != self._temperature
+            if changed:
+                self.temperature = smoothed
+
+        if summary is not None and not self._test_mode:
+            self._log_temperature(summary)
+        if changed:
+            self._publish_event()
+
+    def shutdown(self):
+        """
+        Log the temperature readings from the interval still in progress,
+        which would otherwise be lost, and disconnect from the broker.
+        """
+        with self._temperature_lock:
+            summaries = self.temperature_log.flush()
+        if not self._test_mode:
+            for summary in summaries.values():
+                self._log_temperature(summary)
+        self.mqtt_device.disconnect()
+
+    def _log_temperature(self, summary: tuple):
         """
-        Handle messages received from the sensor. Extract and record the
-        current temperature in the car park, then handle the car entering or
-        exiting the car park.
+        Log a summary of the temperature readings over one interval.
+
+        :param summary: tuple of (start, mean, min, max, count) as returned by
+            Downsampler.add()
+        """
+        start, mean, minimum, maximum, count = summary
+        readable_time = datetime.fromtimestamp(start).strftime('%H:%M')
+        self._log_update(
+            f"TIME: {readable_time}, MEANC: {mean:.1f}, MINC: {minimum}, "
+            + f"MAXC: {maximum}, READINGS: {count}",
+            '-temperature'
+        )
+
+    def on_sensor_message(self, client, userdata, msg: 'MQTTMessage'):
+        """
+        Handle a car entering or exiting the car park, as reported by the
+        sensor.
+
+        :param client: The MQTT client which received the message.
+        :param userdata: userdata passed with the MQTT message
+        :param msg: the message received, in MQTTMessage format
+        """
+        payload = msg.payload.decode()
+        if 'exit' in payload:
+            self.on_car_exit()
+        else:
+            self.on_car_entry()
+
+    def on_temperature_message(self, client, userdata, msg: 'MQTTMessage'):
+        """
+        Handle a periodic temperature reading from the sensor.
 
         :param client: The MQTT client which received the message.
         :param userdata: userdata passed with the MQTT message
@@ -152,19 +257,19 @@ class CarPark:
         for field in fields:
             if field.strip().startswith('TEMPC'):
                 data = field.split(':', 1)[1]
+                # keep the last good temperature rather than forgetting it
+                # because of one bad reading
                 try:
-                    new_temperature = int(data.strip())
-                    self.temperature = new_temperature
+                    reading = float(data.strip())
                 except ValueError as value_error:
-                    self.temperature = None
-                    print("Error: Unable to parse temperature as int.")
+                    print("Error: Unable to parse temperature.")
                     print(value_error)
-
-        if 'exit' in payload:
-            self.on_car_exit()
-        else:
-            self.on_car_entry()
-
+                    continue
+                if not math.isfinite(reading):
+                    print("Error: Ignoring non-finite temperature reading "
+                          + f"{reading}.")
+                    continue
+                self.on_temperature(reading)
 
 if __name__ == '__main__':
     car_park = CarPark('../config/city_square_parking.toml')
\ No newline at end of file
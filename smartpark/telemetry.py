@@ -0,0 +1,162 @@
+"""
+Processing for the periodic temperature readings sent by car park sensors:
+smoothing out sensor noise, rejecting outliers, summarising readings for
+storage and spotting car parks whose temperature is out of line with the
+rest.
+"""
+import math
+import statistics
+
+
+class TemperatureFilter:
+    """
+    Smooths a stream of temperature readings with an exponentially weighted
+    moving average (EWMA). Readings far outside the recent spread are rejected
+    as sensor glitches, unless several arrive in a row, in which case the
+    temperature has genuinely changed and the filter starts again from there.
+    """
+    ALPHA = 0.3  # weight given to each new reading
+    THRESHOLD = 4.0  # standard deviations from the average to reject
+    MIN_DEVIATION = 1.0  # stops a steady sensor rejecting every change
+    WARM_UP = 5  # readings accepted before any are rejected
+    MAX_REJECTIONS = 3  # consecutive rejections before starting again
+
+    def __init__(self):
+        """Create a filter with no readings yet."""
+        self.reset()
+
+    def reset(self):
+        """Forget all readings received so far."""
+        self._mean = None
+        self._variance = 0.0
+        self._count = 0
+        self._rejections = 0
+
+    @property
+    def value(self):
+        """Return the smoothed temperature, or None if there are no readings."""
+        return self._mean
+
+    def update(self, reading: float) -> bool:
+        """
+        Add a reading to the filter.
+
+        :param reading: float, temperature reading from the sensor
+        :returns: boolean representing whether the reading was accepted
+        """
+        if not math.isfinite(reading):
+            # NaN would poison the average, as it fails every comparison
+            return False
+        if self._mean is None:
+            self._mean = float(reading)
+            self._count = 1
+            return True
+
+        difference = reading - self._mean
+        deviation = max(math.sqrt(self._variance), self.MIN_DEVIATION)
+        if (self._count >= self.WARM_UP
+                and abs(difference) > self.THRESHOLD * deviation):
+            self._rejections += 1
+            if self._rejections < self.MAX_REJECTIONS:
+                return False
+            self.reset()
+            return self.update(reading)
+
+        self._rejections = 0
+        self._count += 1
+        increment = self.ALPHA * difference
+        self._mean += increment
+        self._variance = (1 - self.ALPHA) * (self._variance
+                                             + difference * increment)
+        return True
+
+
+class Downsampler:
+    """
+    Summarises readings from many car parks into fixed time intervals, so
+    that a reading every few seconds can be stored as one line per interval.
+    """
+    def __init__(self, interval: float):
+        """
+        :param interval: float, length of each summary interval in seconds
+        """
+        self.interval = interval
+        # map each car park to its current bucket: [start, total, min, max,
+        # count]
+        self._buckets = dict()
+
+    def add(self, carpark: str, timestamp: float, reading: float):
+        """
+        Add a reading to the current interval for the car park.
+
+        :param carpark: string containing the name of the car park
+        :param timestamp: float, time of the reading in seconds since the epoch
+        :param reading: float, temperature reading
+        :returns: the summary of the previous interval as a tuple of (start,
+            mean, min, max, count) if this reading starts a new interval,
+            otherwise None
+        """
+        start = timestamp - timestamp % self.interval
+        bucket = self._buckets.get(carpark)
+        summary = None
+        if bucket is not None and bucket[0] != start:
+            summary = self._summarise(bucket)
+            bucket = None
+        if bucket is None:
+            self._buckets[carpark] = [start, reading, reading, reading, 1]
+        else:
+            bucket[1] += reading
+            bucket[2] = min(bucket[2], reading)
+            bucket[3] = max(bucket[3], reading)
+            bucket[4] += 1
+        return summary
+
+    def flush(self) -> dict:
+        """
+        Return the summaries of every interval still in progress and clear
+        them, e.g. when shutting down.
+
+        :returns: dictionary mapping car park names to summary tuples
+        """
+        summaries = {carpark: self._summarise(bucket)
+                     for carpark, bucket in self._buckets.items()}
+        self._buckets.clear()
+        return summaries
+
+    @staticmethod
+    def _summarise(bucket: list) -> tuple:
+        """
+        Convert a bucket into a summary tuple.
+
+        :param bucket: list of [start, total, min, max, count]
+        :returns: tuple of (start, mean, min, max, count)
+        """
+        start, total, minimum, maximum, count = bucket
+        return start, total / count, minimum, maximum, count
+
+
+def find_anomalous_carparks(temperatures: dict,
+                            threshold: float = 3.5) -> list:
+    """
+    Find car parks whose temperature is far from that of the others, using
+    the modified z-score (distance from the median in units of the median
+    absolute deviation). This is robust to the anomalies themselves, unlike a
+    check against the mean.
+
+    :param temperatures: dictionary mapping car park names to temperatures
+    :param threshold: float, modified z-score above which a car park is
+        reported
+    :returns: list of the names of anomalous car parks
+    """
+    if len(temperatures) < 3:
+        return []
+    names = list(temperatures)
+    values = [temperatures[name] for name in names]
+    median = statistics.median(values)
+    deviations = [abs(value - median) for value in values]
+    # don't report tiny differences when nearly every car park agrees
+    spread = max(statistics.median(deviations),
+                 TemperatureFilter.MIN_DEVIATION)
+    limit = threshold * spread / 0.6745
+    return [name for name, deviation in zip(names, deviations)
+            if deviation > limit]
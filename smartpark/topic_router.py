@@ -0,0 +1,164 @@
+"""
+Routes MQTT messages to handlers registered for topic subscriptions, which may
+contain the MQTT wildcards '+' (any one level) and '#' (any remaining
+levels). Subscriptions are stored in a trie keyed by topic level, so the cost
+of routing a message depends on the depth of its topic rather than on the
+number of subscriptions.
+"""
+import threading
+
+
+def topic_matches(subscription: str, topic: str) -> bool:
+    """
+    Check whether a topic matches a single subscription.
+
+    :param subscription: string containing the subscription filter
+    :param topic: string containing the topic a message was published to
+    :returns: boolean representing whether the topic matches
+    """
+    sub_levels = subscription.split('/')
+    topic_levels = topic.split('/')
+    for i, sub_level in enumerate(sub_levels):
+        if sub_level == '#':
+            return True
+        if i >= len(topic_levels):
+            return False
+        if sub_level != '+' and sub_level != topic_levels[i]:
+            return False
+    return len(sub_levels) == len(topic_levels)
+
+
+class _Node:
+    """One level of the subscription trie."""
+    __slots__ = ('children', 'handlers')
+
+    def __init__(self):
+        self.children = dict()
+        # Replaced rather than modified, so it can be read without a lock
+        self.handlers = ()
+
+
+class TopicRouter:
+    """
+    Dispatches messages to the handlers whose subscriptions match the message
+    topic. Handlers take the same arguments as a paho on_message callback, so
+    .dispatch can be used as a client's on_message.
+
+    Handlers may be added and removed from one thread while messages are
+    dispatched from another.
+    """
+    def __init__(self):
+        """Create a router with no subscriptions."""
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def __len__(self):
+        """Return the number of (subscription, handler) pairs registered."""
+        return self._count
+
+    def add(self, subscription: str, handler):
+        """
+        Register a handler for messages matching a subscription.
+
+        :param subscription: string containing the subscription filter
+        :param handler: function taking (client, userdata, msg)
+        :raises ValueError: if '#' appears anywhere but the last level
+        """
+        levels = subscription.split('/')
+        if '#' in levels[:-1]:
+            raise ValueError(f"'#' must be the last level of '{subscription}'")
+        with self._lock:
+            node = self._root
+            for level in levels:
+                child = node.children.get(level)
+                if child is None:
+                    child = _Node()
+                    node.children[level] = child
+                node = child
+            node.handlers = node.handlers + (handler,)
+            self._count += 1
+
+    def remove(self, subscription: str, handler):
+        """
+        Unregister a handler added with the same subscription. Branches of the
+        trie left without handlers are pruned.
+
+        :param subscription: string containing the subscription filter
+        :param handler: the handler to remove
+        :raises KeyError: if the handler is not registered for the subscription
+        """
+        levels = subscription.split('/')
+        with self._lock:
+            path = [self._root]
+            for level in levels:
+                child = path[-1].children.get(level)
+                if child is None:
+                    raise KeyError(subscription)
+                path.append(child)
+
+            node = path[-1]
+            if handler not in node.handlers:
+                raise KeyError(subscription)
+            handlers = list(node.handlers)
+            handlers.remove(handler)
+            node.handlers = tuple(handlers)
+            self._count -= 1
+
+            for level, parent, child in zip(reversed(levels),
+                                            reversed(path[:-1]),
+                                            reversed(path[1:])):
+                if child.handlers or child.children:
+                    break
+                del parent.children[level]
+
+    def match(self, topic: str) -> list:
+        """
+        Find the handlers for every subscription matching a topic. A handler
+        registered for several matching subscriptions is only returned once.
+
+        :param topic: string containing the topic a message was published to
+        :returns: list of handlers
+        """
+        levels = topic.split('/')
+        matched = []
+        nodes = [self._root]
+        for depth, level in enumerate(levels):
+            next_nodes = []
+            # MQTT wildcards don't match topics starting with '$'
+            wildcards = not (depth == 0 and level.startswith('$'))
+            for node in nodes:
+                children = node.children
+                if wildcards and '#' in children:
+                    matched.extend(children['#'].handlers)
+                if wildcards and '+' in children:
+                    next_nodes.append(children['+'])
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+            if not next_nodes:
+                break
+            nodes = next_nodes
+        else:
+            for node in nodes:
+                matched.extend(node.handlers)
+                # '#' also matches the parent level, so 'a/#' matches 'a'
+                if '#' in node.children:
+                    matched.extend(node.children['#'].handlers)
+
+        # remove duplicates, keeping the order handlers were found in
+        return list(dict.fromkeys(matched))
+
+    def dispatch(self, client, userdata, msg) -> int:
+        """
+        Pass a message to every handler with a matching subscription.
+
+        :param client: The MQTT client which received the message.
+        :param userdata: userdata passed with the MQTT message
+        :param msg: the message received, with topic and payload attributes
+        :returns: integer, number of handlers the message was passed to
+        """
+        handlers = self.match(msg.topic)
+        for handler in handlers:
+            handler(client, userdata, msg)
+        return len(handlers)
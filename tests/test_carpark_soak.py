@@ -0,0 +1,300 @@
+"""
+Soak tests for car park counting. Replays long generated streams of sensor
+messages through CarPark, with the network layer stubbed out, and checks that
+the counts stay correct. The throughput tests print throughput and memory
+use (use pytest -s to see them).
+
+The default runs are short enough for the normal test suite. Set SOAK_EVENTS
+for a longer run, e.g.
+
+    SOAK_EVENTS=5000000 python -m pytest -s test_carpark_soak.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+from smartpark.local_bus import LocalMessage
+from smartpark.simple_mqtt_carpark import CarPark, mqtt_device
+
+SOAK_EVENTS = int(os.environ.get('SOAK_EVENTS', 20000))
+THREADS = 8
+# allowed growth in memory use once the car park has warmed up
+MEMORY_GROWTH_LIMIT = 1_000_000
+
+
+class StubClient:
+    """Stands in for the paho client, discarding everything published."""
+    def __init__(self):
+        self.on_connect = None
+        self.on_message = None
+        self.published = 0
+
+    def connect(self, host, port=None, keepalive=60):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published += 1
+
+    def loop_forever(self):
+        pass
+
+
+def generate_events(count: int, seed: int, exit_rate: float = 0.5,
+                    duplicate_rate: float = 0.05, reorder_window: int = 8,
+                    temperature_rate: float = 0.1):
+    """
+    Generate a stream of sensor events lazily, so long runs use constant
+    memory. Some events are duplicated and the order of events is shuffled
+    within small windows, as can happen with a flaky network.
+
+    :param count: integer, number of events to generate
+    :param seed: integer, seed for the random number generator
+    :param exit_rate: float, proportion of car events that are exits
+    :param duplicate_rate: float, proportion of events delivered twice
+    :param reorder_window: integer, number of consecutive events that may be
+        delivered in any order
+    :param temperature_rate: float, proportion of events that are temperature
+        readings rather than cars
+    :returns: generator of 'entry', 'exit' or 'temperature' strings
+    """
+    rng = random.Random(seed)
+    window = []
+    for _ in range(count):
+        if rng.random() < temperature_rate:
+            event = 'temperature'
+        elif rng.random() < exit_rate:
+            event = 'exit'
+        else:
+            event = 'entry'
+        window.append(event)
+        if rng.random() < duplicate_rate:
+            window.append(event)
+        if len(window) >= reorder_window:
+            rng.shuffle(window)
+            yield from window
+            window.clear()
+    rng.shuffle(window)
+    yield from window
+
+
+class TestCarParkSoak(unittest.TestCase):
+    """Soak tests for CarPark counting."""
+    def setUp(self):
+        """Create a CarPark in testing mode with the network stubbed out."""
+        patcher = mock.patch.object(mqtt_device.MqttDevice,
+                                    '_create_paho_client',
+                                    side_effect=StubClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # CarPark prints every update; millions of lines would swamp the run
+        devnull = open(os.devnull, 'w')
+        self.addCleanup(devnull.close)
+        patcher = mock.patch('sys.stdout', devnull)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.carpark = CarPark('../config/tiny_carpark.toml', test_mode=True)
+        device = self.carpark.mqtt_device
+        self.messages = {
+            'entry': LocalMessage(device.sensor_topic,
+                                  b'ACTION: entry, TIME: 10:00'),
+            'exit': LocalMessage(device.sensor_topic,
+                                 b'ACTION: exit, TIME: 10:00'),
+            'temperature': LocalMessage(device.temperature_topic,
+                                        b'TIME: 10:00, TEMPC: 21'),
+        }
+
+    def measure(self, name: str, run):
+        """
+        Time a run, then repeat it with tracemalloc to measure memory use.
+        Tracing slows every allocation, so it would distort the timing if
+        both were measured in one pass. The timed pass also warms up the car
+        park, so memory still held after the traced pass is growth.
+
+        Print the throughput and memory use, bypassing the redirection of
+        CarPark's output.
+
+        :param name: string naming the run in the report
+        :param run: function which runs the workload and returns the number
+            of events delivered
+        :returns: integer, bytes of memory still held after the traced pass
+        """
+        start = time.perf_counter()
+        events = run()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            run()
+            memory, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        print(f"{name}: {events} events in {elapsed:.2f}s "
+              f"({events / elapsed:.0f} events/s), "
+              f"peak traced memory {peak / 1_000_000:.2f} MB",
+              file=sys.__stdout__)
+        return memory
+
+    def dispatch(self, event: str):
+        """Deliver a sensor message to the car park through its router."""
+        self.carpark.mqtt_device.router.dispatch(None, None,
+                                                 self.messages[event])
+
+    def run_threads(self, events_per_thread) -> dict:
+        """
+        Deliver events from several threads at once.
+
+        :param events_per_thread: function taking a thread number and
+            returning the iterable of events for that thread to deliver
+        :returns: dictionary mapping each kind of event to the number
+            delivered
+        """
+        counts = [dict() for _ in range(THREADS)]
+
+        def deliver(number):
+            for event in events_per_thread(number):
+                self.dispatch(event)
+                counts[number][event] = counts[number].get(event, 0) + 1
+
+        threads = [threading.Thread(target=deliver, args=(number,))
+                   for number in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        totals = dict()
+        for thread_counts in counts:
+            for event, count in thread_counts.items():
+                totals[event] = totals.get(event, 0) + count
+        return totals
+
+    def test_counts_match_sequential_model(self):
+        """
+        After every event the car count matches a simple model of the car
+        park and is never negative, and every car counted in is either still
+        there or has been counted out.
+        """
+        initial_cars = self.carpark.total_cars
+        expected_cars = initial_cars
+        entries = exits_counted = 0
+
+        for event in generate_events(SOAK_EVENTS, seed=26):
+            self.dispatch(event)
+            if event == 'entry':
+                entries += 1
+                expected_cars += 1
+            elif event == 'exit' and expected_cars > 0:
+                exits_counted += 1
+                expected_cars -= 1
+
+            self.assertEqual(expected_cars, self.carpark.total_cars)
+            self.assertGreaterEqual(self.carpark.total_cars, 0)
+
+        self.assertEqual(initial_cars + entries - exits_counted,
+                         self.carpark.total_cars)
+
+    def test_concurrent_counts_near_zero(self):
+        """
+        Counts stay exact when several threads deliver entries and exits at
+        once while the car park is nearly empty, where exits race to take the
+        last car.
+
+        Mixed traffic is delivered first, then more exits than there can be
+        cars, then a known number of entries. If any exit was counted without
+        a car to take, the car park would not end up empty after the surplus
+        exits, or would absorb some of the entries that followed.
+        """
+        # The GIL rarely switches threads between reading the count and acting
+        # on it, which would hide races there. Yield after every read so
+        # those races show up in short runs.
+        count_cars = CarPark.total_cars.fget
+
+        def count_then_yield():
+            cars = count_cars(self.carpark)
+            time.sleep(0)
+            return cars
+
+        patcher = mock.patch.object(CarPark, 'total_cars',
+                                    new_callable=mock.PropertyMock,
+                                    side_effect=count_then_yield)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        initial_cars = self.carpark.total_cars
+        per_thread = max(SOAK_EVENTS // THREADS, 1)
+        stop_watching = threading.Event()
+        seen_negative = []
+
+        def watch():
+            while not stop_watching.wait(0.0001):
+                cars = self.carpark.total_cars
+                if cars < 0:
+                    seen_negative.append(cars)
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        try:
+            # more exits than entries keeps the car park close to empty
+            mixed = self.run_threads(
+                lambda number: generate_events(per_thread, seed=number,
+                                               exit_rate=0.6))
+            cars = self.carpark.total_cars
+            entries = mixed.get('entry', 0)
+            # at least every entry beyond the exits is still there, and at
+            # most every car that has entered
+            self.assertGreaterEqual(
+                cars, initial_cars + entries - mixed.get('exit', 0))
+            self.assertLessEqual(cars, initial_cars + entries)
+
+            surplus = per_thread // 10 + 1
+            self.run_threads(
+                lambda number: ['exit'] * (cars // THREADS + 1 + surplus))
+            self.assertEqual(0, self.carpark.total_cars)
+
+            self.run_threads(lambda number: ['entry'] * per_thread)
+            self.assertEqual(per_thread * THREADS, self.carpark.total_cars)
+        finally:
+            stop_watching.set()
+            watcher.join()
+
+        self.assertEqual([], seen_negative)
+
+    def test_sequential_throughput(self):
+        """
+        Report the throughput of delivering events from one thread, and check
+        memory use doesn't grow with the number of events.
+        """
+        def run():
+            count = 0
+            for event in generate_events(SOAK_EVENTS, seed=27):
+                self.dispatch(event)
+                count += 1
+            return count
+
+        growth = self.measure('sequential', run)
+        self.assertLess(growth, MEMORY_GROWTH_LIMIT)
+
+    def test_concurrent_throughput(self):
+        """
+        Report the throughput of delivering events from several threads at
+        once, and check memory use doesn't grow with the number of events.
+        """
+        per_thread = max(SOAK_EVENTS // THREADS, 1)
+
+        def run():
+            counts = self.run_threads(
+                lambda number: generate_events(per_thread, seed=number))
+            return sum(counts.values())
+
+        growth = self.measure(f'{THREADS} threads', run)
+        self.assertLess(growth, MEMORY_GROWTH_LIMIT)
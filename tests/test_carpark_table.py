@@ -0,0 +1,105 @@
+import unittest
+from smartpark.carpark_table import CarParkTableModel, parse_payload
+
+class TestCarParkTableModel(unittest.TestCase):
+    """Unit tests for CarParkTableModel class."""
+    def setUp(self):
+        """Create a table holding a few car parks."""
+        self.model = CarParkTableModel()
+        self.model.update('Tiny Backstreet Carpark', 'Moondalup',
+                          {'SPACES': '2', 'TEMPC': '20', 'TIME': '10:00'})
+        self.model.update('City Square Parking', 'Moondalup',
+                          {'SPACES': '150', 'TEMPC': '22', 'TIME': '10:01'})
+        self.model.update('Beach Parking', 'Seaview',
+                          {'SPACES': '0', 'TEMPC': 'unknown', 'TIME': '10:02'})
+        self.model.take_changes()
+
+    def names(self):
+        """Return the names of the visible rows, in order."""
+        return [row[0] for key, row in self.model.visible_rows(0, 10)]
+
+    def test_parse_payload(self):
+        """Payloads are split into a dictionary of labelled values."""
+        self.assertEqual({'TIME': '10:00', 'SPACES': '2', 'TEMPC': '20'},
+                         parse_payload('TIME: 10:00, SPACES: 2, TEMPC: 20'))
+
+    def test_rows_sorted_by_name_by_default(self):
+        """Rows are sorted by car park name unless told otherwise."""
+        self.assertEqual(['Beach Parking', 'City Square Parking',
+                          'Tiny Backstreet Carpark'], self.names())
+
+    def test_rows_sorted_numerically(self):
+        """Numeric columns sort as numbers rather than as text."""
+        self.model.set_sort('Available bays', reverse=True)
+        self.assertEqual(['City Square Parking', 'Tiny Backstreet Carpark',
+                          'Beach Parking'], self.names())
+
+    def test_unknown_values_sorted_last(self):
+        """Text such as 'unknown' sorts after the numbers in either direction."""
+        self.model.set_sort('Temperature')
+        self.assertEqual(['Tiny Backstreet Carpark', 'City Square Parking',
+                          'Beach Parking'], self.names())
+        self.model.set_sort('Temperature', reverse=True)
+        self.assertEqual(['City Square Parking', 'Tiny Backstreet Carpark',
+                          'Beach Parking'], self.names())
+
+    def test_rows_sorted_by_name_in_reverse(self):
+        """Text columns still sort in descending order when reversed."""
+        self.model.set_sort('Car park', reverse=True)
+        self.assertEqual(['Tiny Backstreet Carpark', 'City Square Parking',
+                          'Beach Parking'], self.names())
+
+    def test_unknown_column_raises_exception(self):
+        """Sorting by a column that doesn't exist raises a ValueError."""
+        with (self.assertRaises(ValueError)):
+            self.model.set_sort('Colour')
+
+    def test_filter_rows(self):
+        """Only rows containing the filter text are shown."""
+        self.model.set_filter('moondalup')
+        self.assertEqual(['City Square Parking', 'Tiny Backstreet Carpark'],
+                         self.names())
+        self.assertEqual(2, self.model.row_count)
+        self.model.set_filter('')
+        self.assertEqual(3, self.model.row_count)
+
+    def test_only_changed_rows_reported(self):
+        """
+        Updating a row reports only that row as changed, and only moves rows
+        when the sort column changes.
+        """
+        self.model.update('Beach Parking', 'Seaview',
+                          {'SPACES': '1', 'TEMPC': '19', 'TIME': '10:05'})
+        self.assertEqual(({('Seaview', 'Beach Parking')}, False),
+                         self.model.take_changes())
+        self.assertEqual(('Beach Parking', 'Seaview', '1', '19', '10:05'),
+                         self.model.row(('Seaview', 'Beach Parking')))
+
+    def test_unchanged_update_ignored(self):
+        """Repeating the same status doesn't mark the row as changed."""
+        self.assertFalse(self.model.update(
+            'Tiny Backstreet Carpark', 'Moondalup',
+            {'SPACES': '2', 'TEMPC': '20', 'TIME': '10:00'}))
+        self.assertEqual((set(), False), self.model.take_changes())
+
+    def test_new_row_changes_order(self):
+        """Adding a car park reports that the order of rows has changed."""
+        self.model.update('Airport Parking', 'Moondalup',
+                          {'SPACES': '500', 'TEMPC': '25', 'TIME': '10:06'})
+        self.assertEqual(({('Moondalup', 'Airport Parking')}, True),
+                         self.model.take_changes())
+        self.assertEqual('Airport Parking', self.names()[0])
+
+    def test_same_name_in_different_locations_kept_apart(self):
+        """
+        Car parks with the same name in different locations get a row each.
+        """
+        self.model.update('Station Parking', 'Moondalup',
+                          {'SPACES': '10', 'TEMPC': '20', 'TIME': '10:07'})
+        self.model.update('Station Parking', 'Seaview',
+                          {'SPACES': '3', 'TEMPC': '18', 'TIME': '10:08'})
+        self.assertEqual(5, len(self.model))
+        self.assertEqual('10', self.model.row(('Moondalup',
+                                               'Station Parking'))[2])
+        self.assertEqual('3', self.model.row(('Seaview',
+                                              'Station Parking'))[2])
@@ -0,0 +1,45 @@
+import threading
+import unittest
+from smartpark.counters import ShardedCounter
+
+class TestShardedCounter(unittest.TestCase):
+    """Unit tests for ShardedCounter class."""
+    def test_starts_at_initial_value(self):
+        """A new counter has its initial value."""
+        self.assertEqual(5, ShardedCounter(5).value)
+
+    def test_add(self):
+        """Amounts added, including negative amounts, are totalled."""
+        counter = ShardedCounter()
+        counter.add()
+        counter.add(3)
+        counter.add(-2)
+        self.assertEqual(2, counter.value)
+
+    def test_no_updates_lost_across_threads(self):
+        """Updates made from many threads at once are all counted."""
+        counter = ShardedCounter()
+
+        def count():
+            for _ in range(10000):
+                counter.add()
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(80000, counter.value)
+
+    def test_finished_threads_folded_into_total(self):
+        """
+        Shards of finished threads are folded into the total, so a thread per
+        update doesn't make the counter grow.
+        """
+        counter = ShardedCounter()
+        for _ in range(50):
+            thread = threading.Thread(target=counter.add)
+            thread.start()
+            thread.join()
+        self.assertEqual(50, counter.value)
+        self.assertLessEqual(len(counter._state[1]), 1)
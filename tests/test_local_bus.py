@@ -0,0 +1,70 @@
+import os
+import queue
+import tempfile
+import unittest
+from smartpark.local_bus import (MQTT_ERR_NO_CONN, LocalBusClient,
+                                 LocalBusHub)
+
+class TestLocalBus(unittest.TestCase):
+    """Unit tests for the local bus hub and client."""
+    def setUp(self):
+        """Start a hub on a temporary socket and connect two clients."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.hub = LocalBusHub(os.path.join(self.directory.name, 'bus.sock'))
+        self.hub.start()
+
+        self.received = queue.Queue()
+        self.subscriber = LocalBusClient()
+        self.subscriber.on_message = (
+            lambda client, userdata, msg: self.received.put(msg))
+        self.subscriber.connect(self.hub.path)
+        self.subscriber.loop_start()
+        self.publisher = LocalBusClient()
+        self.publisher.connect(self.hub.path)
+
+    def tearDown(self):
+        """Disconnect the clients and stop the hub."""
+        self.subscriber.loop_stop()
+        self.publisher.disconnect()
+        self.hub.close()
+        self.directory.cleanup()
+
+    def test_message_delivered_to_subscriber(self):
+        """
+        Messages published to a subscribed topic are delivered with the same
+        topic and payload, and other topics are not delivered.
+        """
+        self.subscriber.subscribe('smartpark/+/+/carpark')
+        # wait until the hub has the subscription before publishing
+        self.subscriber.subscribe('sync')
+        self.subscriber.publish('sync', 'ready')
+        self.assertEqual('sync', self.received.get(timeout=5).topic)
+
+        self.publisher.publish('smartpark/Moondalup/Tiny/sensor', 'ignored')
+        self.publisher.publish('smartpark/Moondalup/Tiny/carpark',
+                               'SPACES: 2')
+        msg = self.received.get(timeout=5)
+        self.assertEqual('smartpark/Moondalup/Tiny/carpark', msg.topic)
+        self.assertEqual(b'SPACES: 2', msg.payload)
+        self.assertTrue(self.received.empty())
+
+    def test_client_reconnects_when_hub_restarts(self):
+        """
+        When the hub goes away, publishing reports an error instead of
+        raising, and the loop reconnects once the hub is back, calling
+        on_connect so subscriptions can be made again.
+        """
+        def on_connect(client, userdata, flags, rc):
+            client.subscribe('sync')
+            client.publish('sync', 'reconnected')
+
+        self.subscriber.on_connect = on_connect
+        path = self.hub.path
+        self.hub.close()
+        self.assertEqual(MQTT_ERR_NO_CONN,
+                         self.publisher.publish('sync', 'lost'))
+
+        self.hub = LocalBusHub(path)
+        self.hub.start()
+        self.assertEqual(b'reconnected',
+                         self.received.get(timeout=5).payload)
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+from smartpark.log_replay import (CaptureWriter, read_capture, read_log,
+                                  replay)
+
+class TestLogReplay(unittest.TestCase):
+    """Unit tests for reading and replaying recorded car park traffic."""
+    def setUp(self):
+        """Create a directory for recordings."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_read_log_recovers_sensor_messages(self):
+        """
+        Changes in available spaces and temperature between log lines are
+        turned back into the sensor messages that caused them.
+        """
+        log_file = os.path.join(self.directory.name, 'tiny.log')
+        with open(log_file, 'w') as file:
+            file.write(
+                "DATE: 2024-05-01, TIME: 10:00, SPACES: 2, TEMPC: unknown\n"
+                "DATE: 2024-05-01, TIME: 10:01, SPACES: 1, TEMPC: unknown\n"
+                "not a log line\n"
+                "DATE: 2024-05-01, TIME: 10:02, SPACES: 1, TEMPC: 21\n"
+                "DATE: 2024-05-01, TIME: 10:05, SPACES: 2, TEMPC: 21\n"
+            )
+        messages = list(read_log(log_file, 'sensor', 'temperature'))
+        self.assertEqual([
+            ('sensor', 'ACTION: entry, TIME: 10:01'),
+            ('temperature', 'TIME: 10:02, TEMPC: 21'),
+            ('sensor', 'ACTION: exit, TIME: 10:05'),
+        ], [(topic, payload) for timestamp, topic, payload in messages])
+        self.assertEqual(240, messages[2][0] - messages[0][0])
+
+    def test_read_log_skips_truncated_line(self):
+        """A line cut short, e.g. by a crash while writing, is skipped."""
+        log_file = os.path.join(self.directory.name, 'tiny.log')
+        with open(log_file, 'w') as file:
+            file.write(
+                "DATE: 2024-05-01, TIME: 10:00, SPACES: 2, TEMPC: 21\n"
+                "DATE: 2024-05-01, TIME: 10:01, SPACES: 1"
+            )
+        messages = list(read_log(log_file, 'sensor', 'temperature'))
+        self.assertEqual([('temperature', 'TIME: 10:00, TEMPC: 21')],
+                         [(topic, payload)
+                          for timestamp, topic, payload in messages])
+
+    def test_read_capture_stops_at_truncated_message(self):
+        """
+        A message cut short at the end of a capture, e.g. by the recorder
+        being killed, is dropped rather than replayed incomplete.
+        """
+        capture_file = os.path.join(self.directory.name, 'capture.bin')
+        writer = CaptureWriter(capture_file)
+        writer.write(1.0, 'smartpark/M/T/sensor',
+                     b'ACTION: entry, TIME: 10:00')
+        writer.write(2.0, 'smartpark/M/T/sensor',
+                     b'ACTION: exit, TIME: 10:01')
+        writer.close()
+        with open(capture_file, 'r+b') as file:
+            file.truncate(os.path.getsize(capture_file) - 20)
+        self.assertEqual([(1.0, 'smartpark/M/T/sensor',
+                           b'ACTION: entry, TIME: 10:00')],
+                         list(read_capture(capture_file)))
+
+    def test_read_log_restart_starts_new_baseline(self):
+        """
+        The line logged when the car park restarts isn't replayed as cars
+        leaving, and replay carries on from it.
+        """
+        log_file = os.path.join(self.directory.name, 'tiny.log')
+        with open(log_file, 'w') as file:
+            file.write(
+                "DATE: 2024-05-01, TIME: 10:00, SPACES: 5, TEMPC: unknown\n"
+                "DATE: 2024-05-01, TIME: 10:01, SPACES: 4, TEMPC: unknown\n"
+                "DATE: 2024-05-01, TIME: 10:02, SPACES: 3, TEMPC: unknown\n"
+                "DATE: 2024-05-01, TIME: 11:00, SPACES: 5, TEMPC: unknown\n"
+                "DATE: 2024-05-01, TIME: 11:01, SPACES: 4, TEMPC: unknown\n"
+            )
+        messages = list(read_log(log_file, 'sensor', 'temperature',
+                                 startup_spaces=5))
+        self.assertEqual(['ACTION: entry, TIME: 10:01',
+                          'ACTION: entry, TIME: 10:02',
+                          'ACTION: entry, TIME: 11:01'],
+                         [payload for timestamp, topic, payload in messages])
+
+    def test_capture_round_trip(self):
+        """Messages written to a capture file are read back unchanged."""
+        capture_file = os.path.join(self.directory.name, 'capture.bin')
+        writer = CaptureWriter(capture_file)
+        writer.write(100.5, 'smartpark/Moondalup/Tiny/sensor',
+                     b'ACTION: entry, TIME: 10:00')
+        writer.write(101.0, 'smartpark/Moondalup/Tiny/temperature',
+                     b'TIME: 10:00, TEMPC: 21')
+        writer.close()
+        self.assertEqual([
+            (100.5, 'smartpark/Moondalup/Tiny/sensor',
+             b'ACTION: entry, TIME: 10:00'),
+            (101.0, 'smartpark/Moondalup/Tiny/temperature',
+             b'TIME: 10:00, TEMPC: 21'),
+        ], list(read_capture(capture_file)))
+
+    def test_read_capture_rejects_other_files(self):
+        """Reading a file that isn't a capture raises a ValueError."""
+        other_file = os.path.join(self.directory.name, 'other.bin')
+        with open(other_file, 'wb') as file:
+            file.write(b'hello')
+        with (self.assertRaises(ValueError)):
+            list(read_capture(other_file))
+
+    def test_replay_keeps_gaps_at_speed(self):
+        """
+        Replaying faster than real time shortens the gaps between messages
+        in proportion, and publishes every message in order.
+        """
+        published = []
+        messages = [(0, 'a', 'first'), (1, 'b', 'second'), (2, 'c', 'third')]
+        count, elapsed = replay(
+            messages, lambda topic, payload: published.append(topic), 10)
+        self.assertEqual(3, count)
+        self.assertEqual(['a', 'b', 'c'], published)
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 1)
+
+    def test_replay_as_fast_as_possible(self):
+        """A speed of 0 ignores the gaps between messages."""
+        messages = [(0, 'a', 'first'), (3600, 'b', 'second')]
+        count, elapsed = replay(messages, lambda topic, payload: None, 0)
+        self.assertEqual(2, count)
+        self.assertLess(elapsed, 1)
@@ -0,0 +1,67 @@
+import os
+import queue
+import tempfile
+import unittest
+from smartpark.local_bus import LocalBusClient, LocalBusHub, SCHEME
+from smartpark.mqtt_device import MqttDevice
+
+class TestLazyConnect(unittest.TestCase):
+    """Unit tests for MqttDevice in lazy-connect mode, using the local bus."""
+    def setUp(self):
+        """Create a lazy device for a local bus hub that isn't running yet."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'bus.sock')
+        self.device = MqttDevice({
+            'name': 'Tiny Backstreet Carpark',
+            'location': 'Moondalup',
+            'topic-root': 'smartpark',
+            'topic-qualifier': 'carpark',
+            'broker': SCHEME + self.path,
+            'port': 1883,
+            'lazy-connect': True,
+        })
+        self.hub = None
+
+    def tearDown(self):
+        """Disconnect the device and stop the hub."""
+        self.device.disconnect()
+        if self.hub is not None:
+            self.hub.close()
+        self.directory.cleanup()
+
+    def test_does_not_block_without_broker(self):
+        """
+        Creating the device returns straight away when the broker can't be
+        reached, and messages published meanwhile are queued.
+        """
+        self.assertFalse(self.device.connected.is_set())
+        self.device.publish(self.device.topic, 'SPACES: 2')
+        self.assertEqual(1, len(self.device._pending))
+
+    def test_queued_message_sent_once_connected(self):
+        """
+        Messages published before the connection is made are sent once the
+        broker becomes available.
+        """
+        self.device.publish(self.device.topic, 'SPACES: 2')
+
+        # Start the hub under another name so the device can't reach it
+        # until the subscriber is ready, then move it into place.
+        self.hub = LocalBusHub(self.path + '.tmp')
+        self.hub.start()
+        received = queue.Queue()
+        subscriber = LocalBusClient()
+        subscriber.on_message = (
+            lambda client, userdata, msg: received.put(msg.payload))
+        subscriber.connect(self.hub.path)
+        subscriber.subscribe(self.device.topic)
+        subscriber.subscribe('sync')
+        subscriber.publish('sync', 'ready')
+        subscriber.loop_start()
+        self.assertEqual(b'ready', received.get(timeout=5))
+        os.rename(self.hub.path, self.path)
+        self.hub.path = self.path
+
+        self.assertTrue(self.device.wait_for_connection(timeout=5))
+        self.assertEqual(b'SPACES: 2', received.get(timeout=5))
+        subscriber.loop_stop()
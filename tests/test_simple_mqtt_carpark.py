@@ -1,4 +1,8 @@
+import threading
+import time
 import unittest
+from unittest import mock
+from paho.mqtt.client import MQTTMessage
 from smartpark.simple_mqtt_carpark import CarPark
 
 class TestCarPark(unittest.TestCase):
@@ -46,6 +50,33 @@ class TestCarPark(unittest.TestCase):
         self.assertEqual(self.carpark.total_spaces,
                          self.carpark.available_spaces)
 
+    def test_simultaneous_exits_take_one_car(self):
+        """
+        When two threads handle exits at once with only one car in the car
+        park, only one exit is counted and later entries still count.
+        """
+        self.carpark.on_car_entry()
+        count_cars = CarPark.total_cars.fget
+
+        def slow_count():
+            # widen the gap between checking for a car and counting the exit
+            cars = count_cars(self.carpark)
+            time.sleep(0.05)
+            return cars
+
+        with mock.patch.object(CarPark, 'total_cars',
+                               new_callable=mock.PropertyMock,
+                               side_effect=slow_count):
+            threads = [threading.Thread(target=self.carpark.on_car_exit)
+                       for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(0, self.carpark.total_cars)
+        self.carpark.on_car_entry()
+        self.assertEqual(1, self.carpark.total_cars)
+
     def test_temperature_can_be_set(self):
         """
         The car park temperature can be set to an integer and read back
@@ -70,4 +101,60 @@ class TestCarPark(unittest.TestCase):
         with (self.assertRaises(ValueError)):
             self.carpark.temperature = '25'
         with (self.assertRaises(ValueError)):
-            self.carpark.temperature = 25.025
\ No newline at end of file
+            self.carpark.temperature = 25.025
+
+    def send_message(self, kind: str, payload: str):
+        """
+        Deliver a message to the car park as if received through MQTT on the
+        car park's topic for the given kind of message.
+        """
+        topic = getattr(self.carpark.mqtt_device, f'{kind}_topic')
+        msg = MQTTMessage(topic=topic.encode())
+        msg.payload = payload.encode()
+        self.carpark.mqtt_device.router.dispatch(None, None, msg)
+
+    def test_temperature_reading_does_not_count_as_car(self):
+        """
+        Temperature readings update the temperature without changing the
+        number of cars.
+        """
+        self.send_message('temperature', 'TIME: 10:00, TEMPC: 21')
+        self.assertEqual(21, self.carpark.temperature)
+        self.assertEqual(0, self.carpark.total_cars)
+
+    def test_bad_temperature_reading_keeps_last_temperature(self):
+        """An unreadable temperature doesn't erase the last known one."""
+        self.send_message('temperature', 'TIME: 10:00, TEMPC: 21')
+        self.send_message('temperature', 'TIME: 10:01, TEMPC: hot')
+        self.assertEqual(21, self.carpark.temperature)
+
+    def test_non_finite_temperature_reading_ignored(self):
+        """
+        NaN or infinite readings are ignored and don't stop later readings
+        from being used.
+        """
+        self.send_message('temperature', 'TIME: 10:00, TEMPC: 21')
+        self.send_message('temperature', 'TIME: 10:01, TEMPC: nan')
+        self.send_message('temperature', 'TIME: 10:01, TEMPC: inf')
+        self.assertEqual(21, self.carpark.temperature)
+        self.send_message('temperature', 'TIME: 10:02, TEMPC: 23')
+        self.assertEqual(22, self.carpark.temperature)
+
+    def test_temperature_logged_on_shutdown(self):
+        """
+        Readings from the interval still in progress are logged when the car
+        park shuts down.
+        """
+        self.send_message('temperature', 'TIME: 10:00, TEMPC: 21')
+        self.carpark._test_mode = False
+        with mock.patch.object(self.carpark, '_log_temperature') as log:
+            self.carpark.shutdown()
+        log.assert_called_once()
+        self.assertEqual(1, log.call_args.args[0][4])
+
+    def test_car_events_handled(self):
+        """Car entry and exit events from the sensor update the count."""
+        self.send_message('sensor', 'ACTION: entry, TIME: 10:00')
+        self.send_message('sensor', 'ACTION: entry, TIME: 10:00')
+        self.send_message('sensor', 'ACTION: exit, TIME: 10:01')
+        self.assertEqual(1, self.carpark.total_cars)
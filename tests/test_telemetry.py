@@ -0,0 +1,76 @@
+import unittest
+from smartpark.telemetry import (Downsampler, TemperatureFilter,
+                                 find_anomalous_carparks)
+
+class TestTemperatureFilter(unittest.TestCase):
+    """Unit tests for TemperatureFilter class."""
+    def setUp(self):
+        """Create a filter that has settled at 20 degrees."""
+        self.filter = TemperatureFilter()
+        for reading in [20, 21, 20, 19, 20, 20]:
+            self.filter.update(reading)
+
+    def test_no_readings_is_unknown(self):
+        """A filter with no readings has no value."""
+        self.assertIsNone(TemperatureFilter().value)
+
+    def test_readings_are_smoothed(self):
+        """A small change moves the smoothed value only part of the way."""
+        self.assertTrue(self.filter.update(22))
+        self.assertLess(self.filter.value, 22)
+        self.assertGreater(self.filter.value, 20)
+
+    def test_outlier_rejected(self):
+        """A single reading far from the others is rejected."""
+        before = self.filter.value
+        self.assertFalse(self.filter.update(80))
+        self.assertEqual(before, self.filter.value)
+
+    def test_non_finite_reading_rejected(self):
+        """NaN and infinite readings are rejected without changing the value."""
+        before = self.filter.value
+        self.assertFalse(self.filter.update(float('nan')))
+        self.assertFalse(self.filter.update(float('inf')))
+        self.assertEqual(before, self.filter.value)
+
+    def test_sustained_change_accepted(self):
+        """
+        Several outlying readings in a row are taken as a real change in
+        temperature.
+        """
+        results = [self.filter.update(35)
+                   for _ in range(TemperatureFilter.MAX_REJECTIONS)]
+        self.assertTrue(results[-1])
+        self.assertEqual(35, self.filter.value)
+
+
+class TestDownsampler(unittest.TestCase):
+    """Unit tests for Downsampler class."""
+    def test_summary_returned_when_interval_ends(self):
+        """
+        Readings are summarised per car park once a reading from the next
+        interval arrives.
+        """
+        downsampler = Downsampler(60)
+        self.assertIsNone(downsampler.add('Tiny', 0, 20))
+        self.assertIsNone(downsampler.add('Tiny', 30, 22))
+        self.assertIsNone(downsampler.add('Other', 30, 10))
+        self.assertEqual((0, 21, 20, 22, 2), downsampler.add('Tiny', 65, 23))
+        self.assertEqual({'Tiny': (60, 23, 23, 23, 1),
+                          'Other': (0, 10, 10, 10, 1)},
+                         downsampler.flush())
+
+
+class TestFindAnomalousCarparks(unittest.TestCase):
+    """Unit tests for find_anomalous_carparks function."""
+    def test_outlying_carpark_found(self):
+        """A car park much hotter than the rest is reported."""
+        temperatures = {f'Carpark {i}': 20 + i % 3 for i in range(20)}
+        temperatures['Carpark 7'] = 45
+        self.assertEqual(['Carpark 7'],
+                         find_anomalous_carparks(temperatures))
+
+    def test_similar_carparks_not_reported(self):
+        """Car parks with nearly equal temperatures aren't reported."""
+        self.assertEqual([], find_anomalous_carparks(
+            {'A': 20, 'B': 20, 'C': 20, 'D': 21}))
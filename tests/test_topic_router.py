@@ -0,0 +1,90 @@
+import unittest
+from smartpark.local_bus import LocalMessage
+from smartpark.topic_router import TopicRouter, topic_matches
+
+class TestTopicRouter(unittest.TestCase):
+    """Unit tests for TopicRouter class."""
+    def setUp(self):
+        """Create a router with handlers for a few subscriptions."""
+        self.router = TopicRouter()
+        self.received = []
+        self.handlers = dict()
+        for subscription in ['smartpark/Moondalup/Tiny/sensor',
+                             'smartpark/+/+/carpark',
+                             'smartpark/Moondalup/#',
+                             '#']:
+            self.handlers[subscription] = self.make_handler(subscription)
+            self.router.add(subscription, self.handlers[subscription])
+
+    def make_handler(self, name: str):
+        """Return a handler that records the messages it receives."""
+        return lambda client, userdata, msg: self.received.append(
+            (name, msg.topic))
+
+    def matched(self, topic: str) -> set:
+        """Return the subscriptions whose handlers match the topic."""
+        return {name for name, handler in self.handlers.items()
+                if handler in self.router.match(topic)}
+
+    def test_topic_matches_wildcards(self):
+        """Subscriptions match topics using the MQTT wildcard rules."""
+        self.assertTrue(topic_matches('sensor', 'sensor'))
+        self.assertFalse(topic_matches('sensor', 'carpark'))
+        self.assertTrue(topic_matches('smartpark/+/+/carpark',
+                                      'smartpark/Moondalup/Tiny/carpark'))
+        self.assertFalse(topic_matches('smartpark/+/carpark',
+                                       'smartpark/Moondalup/Tiny/carpark'))
+        self.assertTrue(topic_matches('smartpark/#', 'smartpark/a/b/c'))
+        self.assertTrue(topic_matches('smartpark/#', 'smartpark'))
+
+    def test_exact_and_wildcard_matches(self):
+        """A topic matches exact, '+' and '#' subscriptions."""
+        self.assertEqual({'smartpark/Moondalup/Tiny/sensor',
+                          'smartpark/Moondalup/#', '#'},
+                         self.matched('smartpark/Moondalup/Tiny/sensor'))
+        self.assertEqual({'smartpark/+/+/carpark', '#'},
+                         self.matched('smartpark/Seaview/Beach/carpark'))
+        self.assertEqual({'smartpark/Moondalup/#', '#'},
+                         self.matched('smartpark/Moondalup'))
+        self.assertEqual({'#'}, self.matched('other'))
+
+    def test_trie_agrees_with_single_matches(self):
+        """The router matches exactly the subscriptions topic_matches does."""
+        for topic in ['smartpark/Moondalup/Tiny/sensor',
+                      'smartpark/Moondalup/Tiny/carpark',
+                      'smartpark/Seaview/Beach/carpark/extra',
+                      'smartpark', 'smartpark/Seaview', '']:
+            expected = {subscription for subscription in self.handlers
+                        if topic_matches(subscription, topic)}
+            self.assertEqual(expected, self.matched(topic), topic)
+
+    def test_dollar_topics_not_matched_by_wildcards(self):
+        """Wildcards at the first level don't match topics starting with $."""
+        self.assertEqual(set(), self.matched('$SYS/broker/uptime'))
+
+    def test_dispatch_calls_each_handler_once(self):
+        """
+        A handler registered for two matching subscriptions receives the
+        message once.
+        """
+        handler = self.make_handler('twice')
+        self.router.add('smartpark/+/Tiny/sensor', handler)
+        self.router.add('smartpark/Moondalup/+/sensor', handler)
+        count = self.router.dispatch(
+            None, None, LocalMessage('smartpark/Moondalup/Tiny/sensor', b''))
+        self.assertEqual(4, count)
+        self.assertEqual(1, self.received.count(
+            ('twice', 'smartpark/Moondalup/Tiny/sensor')))
+
+    def test_remove_handler(self):
+        """A removed handler no longer receives messages."""
+        self.router.remove('#', self.handlers['#'])
+        self.assertEqual(set(), self.matched('other'))
+        self.assertEqual(3, len(self.router))
+        with (self.assertRaises(KeyError)):
+            self.router.remove('#', self.handlers['#'])
+
+    def test_invalid_subscription_raises_exception(self):
+        """'#' anywhere but the last level raises a ValueError."""
+        with (self.assertRaises(ValueError)):
+            self.router.add('smartpark/#/sensor', self.handlers['#'])